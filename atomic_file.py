@@ -0,0 +1,21 @@
+import os
+import threading
+
+# Replace path with data (bytes, or str written as UTF-8) through a temporary file in
+# the same directory, so concurrent readers see the old file or the new one, never half
+# a file. The temporary name carries the process and thread id: the UI and the scraper
+# service write to the same cache directories.
+def write_atomic(path, data):
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    temporary = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(temporary, "wb") as f:
+            f.write(data)
+        os.replace(temporary, path)
+    except BaseException:
+        try:
+            os.remove(temporary)
+        except OSError:
+            pass
+        raise
@@ -0,0 +1,162 @@
+import argparse
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import scraper
+from benchmarks.run import synthetic_listing
+from database import DatabaseManager
+from metrics import METRICS
+from sources import SourceRegistry
+
+# Faults the stand-in can inject:
+#   ok        every request answers normally
+#   flaky     a share (--rate) of requests answer 503
+#   throttle  a share of requests answer 429 with Retry-After: 1
+#   slow      a share of requests stall longer than the read timeout
+#   down      a share of requests get the connection closed without an answer
+FAULTS = ("ok", "flaky", "throttle", "slow", "down")
+
+# Local stand-in for Digiato: synthetic topic listings under /topic/<slug> and an
+# article page for any other path, with faults injected at the configured rate
+class FaultServer:
+    def __init__(self, fault="ok", rate=0.5, stall=30.0, seed=0):
+        if fault not in FAULTS:
+            raise ValueError(f"unknown fault {fault!r}, expected one of {', '.join(FAULTS)}")
+        self.fault = fault
+        self.rate = rate
+        self.stall = stall
+        self.requests = 0
+        self.faults = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self.base_url = f"http://127.0.0.1:{self._server.server_port}"
+        self.pages = {}
+        for index, category in enumerate(scraper.CATEGORIES):
+            slug = category["url"].rstrip("/").rsplit("/", 1)[-1]
+            html = synthetic_listing(category, seed=index).replace("https://digiato.com", self.base_url)
+            self.pages[f"/topic/{slug}"] = html.encode("utf-8")
+    
+    def _inject(self):
+        with self._lock:
+            self.requests += 1
+            injected = self.fault != "ok" and self._rng.random() < self.rate
+            if injected:
+                self.faults += 1
+            return injected
+    
+    def _handler(self):
+        server = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if server._inject():
+                    if server.fault == "flaky":
+                        return self._answer(503, b"unavailable")
+                    if server.fault == "throttle":
+                        return self._answer(429, b"slow down", {"Retry-After": "1"})
+                    if server.fault == "slow":
+                        time.sleep(server.stall)
+                    elif server.fault == "down":
+                        self.close_connection = True
+                        self.connection.close()
+                        return
+                
+                body = server.pages.get(self.path.rstrip("/"))
+                if body is None:
+                    body = f'<html><body><article><div class="entry-content"><p>{self.path}</p></div></article></body></html>'.encode("utf-8")
+                self._answer(200, body, {"Content-Type": "text/html; charset=utf-8"})
+            
+            def _answer(self, status, body, headers=None):
+                self.send_response(status)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            
+            def log_message(self, format, *args):
+                pass
+        
+        return Handler
+    
+    # Registry pointing the configured categories at this server
+    def registry(self):
+        sources = [
+            {"name": category["name"], "url": self.base_url + path}
+            for category, path in zip(scraper.CATEGORIES, self.pages)
+        ]
+        return SourceRegistry(sources, hosts={"127.0.0.1": {"rate": 1000, "burst": 1000, "concurrency": 8}})
+    
+    def __enter__(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+    
+    def __exit__(self, *exc_info):
+        self._server.shutdown()
+        self._server.server_close()
+
+# One full scrape against the stand-in, listings and then the full-text stage; returns
+# wall times, outcome and resilience counters
+def run_against(fault, rate, read_timeout, stall):
+    scraper.FETCH_TIMEOUT = (scraper.FETCH_CONNECT_TIMEOUT, read_timeout)
+    errors = []
+    
+    def report(level, message):
+        if level == "error":
+            errors.append(message)
+    
+    with FaultServer(fault, rate, stall) as server, tempfile.TemporaryDirectory() as directory:
+        registry = server.registry()
+        db = DatabaseManager(os.path.join(directory, "fault.db"))
+        try:
+            session = scraper.create_http_session(registry)
+            started = time.perf_counter()
+            changed = scraper.run_scrape(db, session, report=report, registry=registry)
+            elapsed = time.perf_counter() - started
+            scraper.run_enrichment(db, session, registry)
+            enrichment_elapsed = time.perf_counter() - started - elapsed
+        finally:
+            db.close()
+    
+    counters = [row for row in METRICS.counters() if row["name"].startswith(("http_retries_total", "circuit_"))]
+    return {
+        "fault": fault,
+        "rate": rate,
+        "seconds": round(elapsed, 3),
+        "enrichment_seconds": round(enrichment_elapsed, 3),
+        "articles_changed": changed,
+        "requests": server.requests,
+        "faults_injected": server.faults,
+        "errors": errors,
+        "counters": counters,
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Scrape a local Digiato stand-in that injects faults, to check retries and circuit breakers")
+    parser.add_argument("--fault", choices=FAULTS, default="flaky", help="kind of fault to inject")
+    parser.add_argument("--rate", type=float, default=0.5, help="share of requests that get the fault")
+    parser.add_argument("--read-timeout", type=float, default=2.0, help="scraper read timeout in seconds for this run")
+    parser.add_argument("--stall", type=float, default=30.0, help="seconds a stalled request hangs in the slow fault")
+    parser.add_argument("--serve", action="store_true", help="only run the stand-in until interrupted, printing its base URL")
+    args = parser.parse_args(argv)
+    
+    if args.serve:
+        with FaultServer(args.fault, args.rate, args.stall) as server:
+            print(f"Serving {args.fault} stand-in at {server.base_url}/topic/<slug>", flush=True)
+            try:
+                threading.Event().wait()
+            except KeyboardInterrupt:
+                pass
+        return
+    
+    print(json.dumps(run_against(args.fault, args.rate, args.read_timeout, args.stall), ensure_ascii=False, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,31 @@
+import argparse
+import os
+
+from scraper import CATEGORIES, create_http_session, FETCH_TIMEOUT
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+
+# File name of the saved listing page of a category, e.g. tech.html
+def fixture_name(category):
+    return f"{category['url'].rstrip('/').rsplit('/', 1)[-1]}.html"
+
+# Download the topic listing pages once so the benchmarks can run without network
+def record_fixtures(output_dir=FIXTURES_DIR):
+    os.makedirs(output_dir, exist_ok=True)
+    session = create_http_session()
+    for category in CATEGORIES:
+        response = session.get(category["url"], timeout=FETCH_TIMEOUT)
+        response.raise_for_status()
+        path = os.path.join(output_dir, fixture_name(category))
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(response.text)
+        print(f"Saved {category['url']} -> {path} ({len(response.content)} bytes)")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Record Digiato topic pages as benchmark fixtures")
+    parser.add_argument("--output", default=FIXTURES_DIR, help="directory for the saved HTML files")
+    args = parser.parse_args(argv)
+    record_fixtures(args.output)
+
+if __name__ == "__main__":
+    main()
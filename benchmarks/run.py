@@ -0,0 +1,217 @@
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import time
+from datetime import datetime, timedelta, timezone
+
+from benchmarks.record_fixtures import FIXTURES_DIR, fixture_name
+from database import (
+    DatabaseManager,
+    build_search_query,
+    content_hash,
+    query_category_facets,
+    query_news_count,
+    query_news_page,
+    query_search,
+)
+from scraper import CATEGORIES, PARSER_BACKEND, extract_articles
+
+# Synthetic databases are generated once per size and reused by later runs
+DATA_DIR = os.path.join(os.path.dirname(__file__), ".data")
+DEFAULT_SIZES = [10_000, 1_000_000, 10_000_000]
+INSERT_BATCH = 50_000
+PER_PAGE = 5
+
+# Small Persian vocabulary, so synthetic titles and bodies exercise the search index
+WORDS = [
+    "هوش", "مصنوعی", "خودرو", "برقی", "گوشی", "هوشمند", "اپل", "سامسونگ", "باتری", "فضا",
+    "ناسا", "بازار", "بورس", "استارتاپ", "اینترنت", "ماهواره", "تراشه", "پردازنده", "شبکه", "امنیت",
+    "داده", "رمزارز", "بیت‌کوین", "گوگل", "مایکروسافت", "ربات", "نرم‌افزار", "سخت‌افزار", "بازی", "کنسول",
+]
+
+# Time fn over `repeat` calls after one warm-up call; durations in milliseconds
+def measure(fn, repeat):
+    fn()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return {
+        "repeat": repeat,
+        "min_ms": round(min(samples), 4),
+        "median_ms": round(statistics.median(samples), 4),
+        "mean_ms": round(statistics.fmean(samples), 4),
+    }
+
+# Listing pages in Digiato's markup, used when no recorded fixtures are available
+def synthetic_listing(category, articles=24, seed=0):
+    rng = random.Random(seed)
+    cards = []
+    for i in range(articles):
+        title = " ".join(rng.choices(WORDS, k=8))
+        body = " ".join(rng.choices(WORDS, k=40))
+        cards.append(
+            f'<article class="rowCard"><a href="/{i}"><img src="/img/{i}.jpg"></a>'
+            f'<h3><a href="https://digiato.com/article/{seed}-{i}">{title}</a></h3>'
+            f'<p class="rowCard__description">{body}</p><time>۱۴۰۳/۰۱/۰۱</time></article>'
+        )
+    chrome = "".join(f'<li><a href="/topic/{i}">{" ".join(rng.choices(WORDS, k=2))}</a></li>' for i in range(300))
+    return (
+        f'<html><head><title>{category["name"]}</title><script>{"var x=1;" * 2000}</script></head>'
+        f'<body><nav><ul>{chrome}</ul></nav><main>{"".join(cards)}</main><footer><ul>{chrome}</ul></footer></body></html>'
+    )
+
+# (category, html, origin) for every topic page, preferring recorded fixtures
+def load_listing_pages():
+    pages = []
+    for category in CATEGORIES:
+        path = os.path.join(FIXTURES_DIR, fixture_name(category))
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                pages.append((category, f.read(), "recorded"))
+        else:
+            pages.append((category, synthetic_listing(category, seed=len(pages)), "synthetic"))
+    return pages
+
+# Parse + extract timing of the listing pages, as done per page in scrape_and_store_news
+def bench_parse(repeat):
+    results = []
+    for category, html, origin in load_listing_pages():
+        articles = extract_articles(html, category)
+        results.append({
+            "name": f"parse/{fixture_name(category)}",
+            "fixtures": origin,
+            "bytes": len(html.encode("utf-8")),
+            "articles": len(articles),
+            **measure(lambda: extract_articles(html, category), repeat),
+        })
+    return results
+
+# Build (or reuse) a database with `size` synthetic articles
+def synthetic_database(size):
+    os.makedirs(DATA_DIR, exist_ok=True)
+    path = os.path.join(DATA_DIR, f"news_{size}.db")
+    db = DatabaseManager(path)
+    with db.reader() as conn:
+        existing = conn.execute("SELECT COUNT(*) FROM news").fetchone()[0]
+    if existing == size:
+        return db
+    
+    db.close()
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    db = DatabaseManager(path)
+    
+    print(f"Generating {size} synthetic articles in {path} ...")
+    rng = random.Random(size)
+    start = datetime(2020, 1, 1)
+    names = [category["name"] for category in CATEGORIES]
+    for batch_start in range(0, size, INSERT_BATCH):
+        rows = []
+        for i in range(batch_start, min(size, batch_start + INSERT_BATCH)):
+            title = " ".join(rng.choices(WORDS, k=8))
+            body = " ".join(rng.choices(WORDS, k=30))
+            category = names[i % len(names)]
+            # Several articles share each second, as real scrapes insert them in bursts
+            timestamp = (start + timedelta(seconds=i // 3)).strftime("%Y-%m-%d %H:%M:%S")
+            rows.append((title, body, f"https://digiato.com/bench/{i}", category, timestamp, content_hash(title, body)))
+        with db.writer() as conn:
+            conn.executemany(
+                "INSERT INTO news (title, body, source_url, category, timestamp, content_hash) VALUES (?, ?, ?, ?, ?, ?)",
+                rows
+            )
+    with db.writer() as conn:
+        conn.execute("ANALYZE")
+    return db
+
+# Count, paging and search timings against one synthetic table size
+def bench_database(size, repeat):
+    db = synthetic_database(size)
+    category = CATEGORIES[0]["name"]
+    results = []
+    
+    def add(name, fn):
+        results.append({"name": name, "rows": size, **measure(fn, repeat)})
+    
+    add("get_news_count/all", lambda: query_news_count(db, None))
+    add("get_news_count/category", lambda: query_news_count(db, category))
+    add("category_facets", lambda: query_category_facets(db))
+    
+    # Shallow page, deep page by OFFSET and the same deep page by keyset cursor
+    deep_offset = (size // len(CATEGORIES) // 2 // PER_PAGE) * PER_PAGE
+    add("display_news/page_1", lambda: query_news_page(db, category, None, 0, PER_PAGE))
+    add("display_news/deep_offset", lambda: query_news_page(db, category, None, deep_offset, PER_PAGE))
+    with db.reader() as conn:
+        cursor = conn.execute(
+            "SELECT timestamp, news_id FROM news_categories WHERE category = ? ORDER BY timestamp DESC, news_id DESC LIMIT 1 OFFSET ?",
+            (category, deep_offset - 1)
+        ).fetchone()
+    add("display_news/deep_keyset", lambda: query_news_page(db, category, cursor, 0, PER_PAGE))
+    
+    match = build_search_query("هوش مصنوعی")
+    add("search/all", lambda: query_search(db, match, None, 1, PER_PAGE))
+    add("search/category", lambda: query_search(db, match, category, 1, PER_PAGE))
+    add("search/rare_prefix", lambda: query_search(db, build_search_query("ماهوار"), None, 1, PER_PAGE))
+    
+    db.close()
+    return results
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+# Print median changes against an earlier results file
+def compare(previous_path, report):
+    with open(previous_path, encoding="utf-8") as f:
+        previous = {(r["name"], r.get("rows")): r for r in json.load(f)["results"]}
+    for result in report["results"]:
+        before = previous.get((result["name"], result.get("rows")))
+        if before:
+            ratio = result["median_ms"] / before["median_ms"] if before["median_ms"] else float("inf")
+            print(f"{result['name']:<32} {result.get('rows') or '':>10} {before['median_ms']:>10.3f} -> {result['median_ms']:>10.3f} ms  x{ratio:.2f}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmarks for parsing and database queries")
+    parser.add_argument("--sizes", default=",".join(str(size) for size in DEFAULT_SIZES), help="comma separated synthetic table sizes")
+    parser.add_argument("--repeat", type=int, default=20, help="timed calls per benchmark")
+    parser.add_argument("--skip-parse", action="store_true", help="skip the HTML parse benchmarks")
+    parser.add_argument("--skip-db", action="store_true", help="skip the database benchmarks")
+    parser.add_argument("--output", help="write the JSON report to this file instead of stdout")
+    parser.add_argument("--compare", help="earlier JSON report to compare medians against")
+    args = parser.parse_args(argv)
+    
+    results = []
+    if not args.skip_parse:
+        results.extend(bench_parse(args.repeat))
+    if not args.skip_db:
+        for size in (int(size) for size in args.sizes.split(",") if size):
+            results.extend(bench_database(size, args.repeat))
+    
+    report = {
+        "commit": git_commit(),
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "parser": PARSER_BACKEND,
+        "results": results,
+    }
+    
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    else:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    if args.compare:
+        compare(args.compare, report)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,1123 @@
+import sqlite3
+import os
+import pathlib
+import hashlib
+import itertools
+import re
+import zlib
+import threading
+import time
+import queue
+from contextlib import contextmanager
+from collections import OrderedDict
+
+# zstd compresses article text better and faster than zlib; used when installed
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# SQLite settings: database file, memory-mapped I/O size in bytes, page cache size
+# in KiB (negative per SQLite convention) and how many idle read connections to keep
+DATABASE_PATH = 'data.db'
+DATABASE_MMAP_SIZE = 256 * 1024 * 1024
+DATABASE_CACHE_SIZE = -64000
+DATABASE_READ_POOL_SIZE = 8
+
+# Maximum number of query results kept in the shared result cache
+QUERY_CACHE_SIZE = 512
+
+# A scrape marked in progress for longer than this (seconds) is assumed to have died
+SCRAPE_STALE_AFTER = 30 * 60
+
+# Persistent databases: articles older than RETENTION_DAYS (per category overrides in
+# CATEGORY_RETENTION_DAYS) move to monthly archive tables, and archiving, incremental
+# vacuum and PRAGMA optimize run at most once per MAINTENANCE_INTERVAL seconds
+RETENTION_DAYS = 90
+CATEGORY_RETENTION_DAYS = {}
+MAINTENANCE_INTERVAL = 6 * 3600
+
+# Days the text change log is kept for in-memory indexes to catch up from; an index
+# that fell further behind rebuilds instead
+TEXT_CHANGES_RETENTION_DAYS = 1
+
+# Near-duplicate detection: SimHash fingerprints within this many differing bits are
+# the same story. The 64 bits are split into SIMHASH_BANDS bands; by pigeonhole two
+# fingerprints that close share at least one band exactly, which is what is indexed.
+# Texts with fewer tokens than SIMHASH_MIN_TOKENS are only deduplicated by URL.
+SIMHASH_BITS = 64
+SIMHASH_BANDS = 6
+SIMHASH_MAX_DISTANCE = 5
+SIMHASH_MIN_TOKENS = 8
+
+# Persian text folding shared by the search index and search queries:
+# Arabic yeh/kaf become Persian, ZWNJ/ZWJ and tatweel are removed
+PERSIAN_CHAR_MAP = str.maketrans({
+    'ي': 'ی',
+    'ى': 'ی',
+    'ك': 'ک',
+    '\u200c': None,
+    '\u200d': None,
+    '\u0640': None,
+})
+PERSIAN_DIACRITICS = re.compile('[\u064b-\u065f\u0670]')
+
+# Normalize Persian text before indexing or matching it
+def normalize_persian(text):
+    if not text:
+        return ''
+    return PERSIAN_DIACRITICS.sub('', text.translate(PERSIAN_CHAR_MAP)).lower()
+
+# Open a database connection with the helper functions the schema triggers rely on.
+# A read-only connection never creates the file.
+def connect_database(path=DATABASE_PATH, read_only=False):
+    if read_only:
+        conn = sqlite3.connect(f"{pathlib.Path(path).absolute().as_uri()}?mode=ro", uri=True, check_same_thread=False)
+    else:
+        conn = sqlite3.connect(path, check_same_thread=False)
+    conn.create_function("persian_normalize", 1, normalize_persian, deterministic=True)
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA mmap_size={DATABASE_MMAP_SIZE}")
+    conn.execute(f"PRAGMA cache_size={DATABASE_CACHE_SIZE}")
+    return conn
+
+# Process-wide database access: the schema is set up once, readers borrow pooled
+# connections and all writes are serialized through a single writer connection.
+# WAL mode lets readers keep working while a scrape is writing. With read_only=True
+# (tools such as the export) only read connections are opened: the file must exist
+# and is neither migrated nor converted, and writer() fails.
+class DatabaseManager:
+    def __init__(self, path=DATABASE_PATH, read_only=False):
+        self.path = path
+        self.read_only = read_only
+        self._readers = queue.LifoQueue(maxsize=DATABASE_READ_POOL_SIZE)
+        self._write_lock = threading.Lock()
+        
+        if read_only:
+            self._writer = None
+            return
+        self._writer = connect_database(path)
+        # Only takes effect on a new file; older files are converted by maintain_database
+        self._writer.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        self._writer.execute("PRAGMA journal_mode=WAL")
+        init_database(self._writer)
+    
+    # Borrow a read connection for the current thread and return it to the pool afterwards
+    @contextmanager
+    def reader(self):
+        try:
+            conn = self._readers.get_nowait()
+        except queue.Empty:
+            # Autocommit so reads never hold a transaction open between queries
+            conn = connect_database(self.path, self.read_only)
+            conn.isolation_level = None
+            conn.execute("PRAGMA query_only=ON")
+        try:
+            yield conn
+        finally:
+            try:
+                self._readers.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+    
+    # Use the writer connection exclusively; commits on success, rolls back on error
+    @contextmanager
+    def writer(self):
+        if self._writer is None:
+            raise sqlite3.OperationalError(f"{self.path} is open read-only")
+        with self._write_lock:
+            try:
+                yield self._writer
+                self._writer.commit()
+            except Exception:
+                self._writer.rollback()
+                raise
+    
+    # Data generation number; bumped in every transaction that changes articles
+    def generation(self):
+        with self.reader() as conn:
+            row = conn.execute("SELECT value FROM app_meta WHERE key = 'generation'").fetchone()
+        return row[0] if row else 0
+    
+    def close(self):
+        while True:
+            try:
+                self._readers.get_nowait().close()
+            except queue.Empty:
+                break
+        if self._writer is not None:
+            with self._write_lock:
+                self._writer.close()
+
+# LRU cache of query results keyed on the data generation they were read at.
+# A new generation makes every older entry unreachable, so cached reads are never stale.
+class QueryCache:
+    def __init__(self, max_entries=QUERY_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._generation = None
+        self._lock = threading.Lock()
+    
+    def get_or_compute(self, generation, key, compute):
+        with self._lock:
+            # A request that read the generation just before a newer commit is answered
+            # without the cache, rather than dropping the current entries for it
+            stale = self._generation is not None and generation < self._generation
+            if not stale:
+                # Entries from older generations can never be hit again; drop them at once
+                if generation != self._generation:
+                    self._entries.clear()
+                    self._generation = generation
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return self._entries[key]
+            self.misses += 1
+        
+        value = compute()
+        if stale:
+            return value
+        
+        with self._lock:
+            if generation == self._generation:
+                self._entries[key] = value
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return value
+    
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "generation": self._generation,
+            }
+
+# Record that articles changed; call inside the writing transaction
+def bump_generation(conn):
+    conn.execute("""
+        INSERT INTO app_meta (key, value) VALUES ('generation', 1)
+        ON CONFLICT(key) DO UPDATE SET value = value + 1
+    """)
+
+# Add a column unless an older migration or an older release already did
+def add_column(cursor, table, column, declaration):
+    columns = [row[1] for row in cursor.execute(f"PRAGMA table_info({table})")]
+    if column not in columns:
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {declaration}")
+        return True
+    return False
+
+def table_exists(cursor, name):
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (name,))
+    return cursor.fetchone() is not None
+
+# Schema migrations, applied in order and recorded in PRAGMA user_version. Each one is
+# idempotent, because databases from before the migrations existed are at version 0
+# with part of the schema already in place. Append new steps; never edit applied ones.
+
+def migrate_base_tables(cursor):
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS news (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        title TEXT NOT NULL,
+        body TEXT,
+        source_url TEXT,
+        category TEXT,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+        content_hash TEXT
+    )
+    """)
+    # Databases created before incremental ingestion lack the content hash column
+    add_column(cursor, "news", "content_hash", "TEXT")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_news_title ON news(title)")
+    
+    # Small key/value table for bookkeeping such as the data generation number
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS app_meta (
+        key TEXT PRIMARY KEY,
+        value INTEGER
+    )
+    """)
+    
+    # Single-row status of the scraper, shared by the background service and the UI
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS scrape_status (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        in_progress INTEGER NOT NULL DEFAULT 0,
+        started_at DATETIME,
+        finished_at DATETIME,
+        articles_changed INTEGER,
+        last_error TEXT,
+        fetch_seconds REAL,
+        parse_seconds REAL
+    )
+    """)
+    cursor.execute("INSERT OR IGNORE INTO scrape_status (id) VALUES (1)")
+    add_column(cursor, "scrape_status", "fetch_seconds", "REAL")
+    add_column(cursor, "scrape_status", "parse_seconds", "REAL")
+
+# Articles are keyed by their source URL; drop duplicates left by the old
+# delete-and-reinsert refresh before the unique index is created
+def migrate_unique_source_url(cursor):
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type='index' AND name='idx_news_source_url'")
+    if not cursor.fetchone():
+        cursor.execute("DELETE FROM news WHERE id NOT IN (SELECT MAX(id) FROM news GROUP BY source_url)")
+        cursor.execute("CREATE UNIQUE INDEX idx_news_source_url ON news(source_url)")
+
+# Full-text index over normalized title/body. It is an external-content table,
+# so the text itself is stored only once in news; triggers keep it in sync.
+def migrate_full_text_search(cursor):
+    fts_exists = table_exists(cursor, "news_fts")
+    cursor.execute("""
+    CREATE VIRTUAL TABLE IF NOT EXISTS news_fts USING fts5(
+        title, body,
+        content='news', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """)
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS news_fts_insert AFTER INSERT ON news BEGIN
+        INSERT INTO news_fts(rowid, title, body)
+        VALUES (new.id, persian_normalize(new.title), persian_normalize(new.body));
+    END
+    """)
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS news_fts_delete AFTER DELETE ON news BEGIN
+        INSERT INTO news_fts(news_fts, rowid, title, body)
+        VALUES ('delete', old.id, persian_normalize(old.title), persian_normalize(old.body));
+    END
+    """)
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS news_fts_update AFTER UPDATE OF title, body ON news BEGIN
+        INSERT INTO news_fts(news_fts, rowid, title, body)
+        VALUES ('delete', old.id, persian_normalize(old.title), persian_normalize(old.body));
+        INSERT INTO news_fts(rowid, title, body)
+        VALUES (new.id, persian_normalize(new.title), persian_normalize(new.body));
+    END
+    """)
+    if not fts_exists:
+        cursor.execute("""
+            INSERT INTO news_fts(rowid, title, body)
+            SELECT id, persian_normalize(title), persian_normalize(body) FROM news
+        """)
+
+# Composite index matching the news list order, so pages are read in index order
+# without sorting
+def migrate_timestamp_index(cursor):
+    cursor.execute("DROP INDEX IF EXISTS idx_news_category")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_news_timestamp ON news(timestamp DESC, id DESC)")
+
+# Full article text, compressed and kept apart from news so list queries never
+# read the large blobs. content is NULL when no text could be extracted.
+def migrate_article_content(cursor):
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS news_content (
+        news_id INTEGER PRIMARY KEY,
+        codec TEXT NOT NULL,
+        content BLOB,
+        fetched_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS news_content_delete AFTER DELETE ON news BEGIN
+        DELETE FROM news_content WHERE news_id = old.id;
+    END
+    """)
+
+# An article is stored once and listed under every topic it appeared in.
+# news.category keeps the first topic for display; news_categories is the full
+# mapping, with the article timestamp copied in so category pages are keyset
+# paged straight off idx_news_categories_category_timestamp. It replaces the old
+# per-category index on news.
+def migrate_category_mapping(cursor):
+    categories_exist = table_exists(cursor, "news_categories")
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS news_categories (
+        news_id INTEGER NOT NULL,
+        category TEXT NOT NULL,
+        timestamp DATETIME,
+        PRIMARY KEY (news_id, category)
+    ) WITHOUT ROWID
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_news_categories_category_timestamp ON news_categories(category, timestamp DESC, news_id DESC)")
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS news_categories_insert AFTER INSERT ON news
+    WHEN new.category IS NOT NULL BEGIN
+        INSERT OR IGNORE INTO news_categories (news_id, category, timestamp)
+        VALUES (new.id, new.category, new.timestamp);
+    END
+    """)
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS news_categories_delete AFTER DELETE ON news BEGIN
+        DELETE FROM news_categories WHERE news_id = old.id;
+    END
+    """)
+    if not categories_exist:
+        cursor.execute("""
+            INSERT OR IGNORE INTO news_categories (news_id, category, timestamp)
+            SELECT id, category, timestamp FROM news WHERE category IS NOT NULL
+        """)
+    cursor.execute("DROP INDEX IF EXISTS idx_news_category_timestamp")
+
+# SimHash fingerprints and their bands for near-duplicate lookup:
+# (band number, band value) -> article
+def migrate_simhash(cursor):
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS news_simhash_bands (
+        band INTEGER NOT NULL,
+        value INTEGER NOT NULL,
+        news_id INTEGER NOT NULL,
+        PRIMARY KEY (band, value, news_id)
+    ) WITHOUT ROWID
+    """)
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS news_simhash_bands_delete AFTER DELETE ON news BEGIN
+        DELETE FROM news_simhash_bands WHERE news_id = old.id;
+    END
+    """)
+    if add_column(cursor, "news", "simhash", "INTEGER"):
+        for news_id, title, body in cursor.execute("SELECT id, title, body FROM news").fetchall():
+            fingerprint = simhash(f"{title} {body or ''}")
+            if fingerprint is not None:
+                cursor.execute("UPDATE news SET simhash = ? WHERE id = ?", (to_signed64(fingerprint), news_id))
+                store_simhash_bands(cursor, news_id, fingerprint)
+
+# Counts edits of stored article text, so in-memory indexes built from titles and
+# bodies know to rebuild instead of only adding new rows
+def migrate_text_version(cursor):
+    cursor.execute("INSERT OR IGNORE INTO app_meta (key, value) VALUES ('text_version', 0)")
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS news_text_version AFTER UPDATE OF title, body ON news BEGIN
+        UPDATE app_meta SET value = value + 1 WHERE key = 'text_version';
+    END
+    """)
+
+# Article count and newest timestamp per category, kept exact by triggers so the
+# category list and counts are read in O(categories). The row with the empty
+# category holds the number of distinct articles. The newest timestamp is looked up
+# again through idx_news_categories_category_timestamp when an article is removed.
+def migrate_category_facets(cursor):
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS category_facets (
+        category TEXT PRIMARY KEY,
+        articles INTEGER NOT NULL,
+        latest DATETIME
+    )
+    """)
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS category_facets_insert AFTER INSERT ON news_categories BEGIN
+        INSERT INTO category_facets (category, articles, latest)
+        VALUES (new.category, 1, new.timestamp)
+        ON CONFLICT(category) DO UPDATE SET
+            articles = articles + 1,
+            latest = MAX(COALESCE(latest, excluded.latest), COALESCE(excluded.latest, latest));
+    END
+    """)
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS category_facets_delete AFTER DELETE ON news_categories BEGIN
+        UPDATE category_facets SET
+            articles = articles - 1,
+            latest = (SELECT MAX(timestamp) FROM news_categories WHERE category = old.category)
+        WHERE category = old.category;
+        DELETE FROM category_facets WHERE category = old.category AND articles <= 0;
+    END
+    """)
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS category_facets_total_insert AFTER INSERT ON news BEGIN
+        INSERT INTO category_facets (category, articles, latest)
+        VALUES ('', 1, new.timestamp)
+        ON CONFLICT(category) DO UPDATE SET
+            articles = articles + 1,
+            latest = MAX(COALESCE(latest, excluded.latest), COALESCE(excluded.latest, latest));
+    END
+    """)
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS category_facets_total_delete AFTER DELETE ON news BEGIN
+        UPDATE category_facets SET
+            articles = articles - 1,
+            latest = (SELECT MAX(timestamp) FROM news)
+        WHERE category = '';
+    END
+    """)
+    cursor.execute("DELETE FROM category_facets")
+    cursor.execute("""
+        INSERT INTO category_facets (category, articles, latest)
+        SELECT category, COUNT(*), MAX(timestamp) FROM news_categories GROUP BY category
+    """)
+    cursor.execute("""
+        INSERT INTO category_facets (category, articles, latest)
+        SELECT '', COUNT(*), MAX(timestamp) FROM news
+    """)
+
+# Lead image URL of each article, and the thumbnail fetched for it: the key of the
+# file in the thumbnail cache, or NULL when the image could not be used
+def migrate_thumbnails(cursor):
+    add_column(cursor, "news", "image_url", "TEXT")
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS news_thumbnails (
+        news_id INTEGER PRIMARY KEY,
+        thumbnail TEXT,
+        fetched_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS news_thumbnails_delete AFTER DELETE ON news BEGIN
+        DELETE FROM news_thumbnails WHERE news_id = old.id;
+    END
+    """)
+
+# SHA-256 of the body of every listing page whose articles were merged. The HTTP cache
+# only knows a page is the same as at the last fetch; the page is skipped only when this
+# database also stored that body, so a new or emptied database is filled again.
+def migrate_listing_pages(cursor):
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS listing_pages (
+        url TEXT PRIMARY KEY,
+        body_sha256 TEXT NOT NULL,
+        stored_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+
+# Log of article text that stopped being current: the old title and body of every
+# edited or deleted article. In-memory indexes built from titles and bodies read it to
+# drop exactly those postings instead of rebuilding; it replaces the text_version
+# counter. Pruned by maintain_database.
+def migrate_text_changes(cursor):
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS news_text_changes (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        news_id INTEGER NOT NULL,
+        title TEXT,
+        body TEXT,
+        changed_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS news_text_changes_update AFTER UPDATE OF title, body ON news BEGIN
+        INSERT INTO news_text_changes (news_id, title, body) VALUES (old.id, old.title, old.body);
+    END
+    """)
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS news_text_changes_delete AFTER DELETE ON news BEGIN
+        INSERT INTO news_text_changes (news_id, title, body) VALUES (old.id, old.title, old.body);
+    END
+    """)
+    cursor.execute("DROP TRIGGER IF EXISTS news_text_version")
+
+# Source URLs of stories stored under another article as near-duplicates. Looked up like
+# the article's own URL, so a merged story is neither compared again on every run nor
+# unknown to the crawl's early termination, and every merge leaves a trace.
+def migrate_news_aliases(cursor):
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS news_aliases (
+        source_url TEXT PRIMARY KEY,
+        news_id INTEGER NOT NULL,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_news_aliases_news_id ON news_aliases(news_id)")
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS news_aliases_delete AFTER DELETE ON news BEGIN
+        DELETE FROM news_aliases WHERE news_id = old.id;
+    END
+    """)
+
+MIGRATIONS = [
+    migrate_base_tables,
+    migrate_unique_source_url,
+    migrate_full_text_search,
+    migrate_timestamp_index,
+    migrate_article_content,
+    migrate_category_mapping,
+    migrate_simhash,
+    migrate_text_version,
+    migrate_category_facets,
+    migrate_thumbnails,
+    migrate_listing_pages,
+    migrate_text_changes,
+    migrate_news_aliases,
+]
+
+# Serializes migrations between the threads of this process; other processes are
+# kept out by the write lock of BEGIN IMMEDIATE
+migration_lock = threading.Lock()
+
+# Bring the schema up to date: every migration past PRAGMA user_version runs in its
+# own transaction together with the version bump. The version is re-read under the
+# write lock, so processes starting at the same time apply each step only once.
+def migrate_database(conn):
+    isolation_level = conn.isolation_level
+    conn.isolation_level = None
+    try:
+        while True:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                version = conn.execute("PRAGMA user_version").fetchone()[0]
+                if version > len(MIGRATIONS):
+                    raise RuntimeError(f"database schema version {version} is newer than this code ({len(MIGRATIONS)})")
+                if version == len(MIGRATIONS):
+                    conn.execute("COMMIT")
+                    return version
+                MIGRATIONS[version](conn.cursor())
+                conn.execute(f"PRAGMA user_version = {version + 1}")
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+    finally:
+        conn.isolation_level = isolation_level
+
+# Set up the schema of a fresh or older database. An up-to-date database costs one
+# PRAGMA read and no write lock, so opening it again in the same process (or in the
+# scraper service next to the app) runs no DDL at all.
+# Whether the file at path has every migration of this version applied; False for
+# files that are not databases of this app
+def schema_is_current(path):
+    try:
+        conn = connect_database(path, read_only=True)
+    except sqlite3.Error:
+        return False
+    try:
+        return conn.execute("PRAGMA user_version").fetchone()[0] == len(MIGRATIONS)
+    except sqlite3.DatabaseError:
+        return False
+    finally:
+        conn.close()
+
+def init_database(conn):
+    if conn.execute("PRAGMA user_version").fetchone()[0] == len(MIGRATIONS):
+        return
+    with migration_lock:
+        migrate_database(conn)
+
+# Cleanup database when app exits
+def cleanup_database(path=DATABASE_PATH):
+    try:
+        if os.path.exists(path):
+            # WAL mode keeps two side files next to the database
+            for file_path in (path, f"{path}-wal", f"{path}-shm"):
+                if os.path.exists(file_path):
+                    os.remove(file_path)
+            print("Database cleaned up successfully")
+    except Exception as e:
+        print(f"Error cleaning up database: {e}")
+
+# Hash of the stored text fields, used to skip rewriting articles that did not change
+def content_hash(title, body):
+    return hashlib.sha1(f"{title}\x1f{body}".encode("utf-8")).hexdigest()
+
+# 64-bit SimHash of the normalized words of a text, or None when the text is too
+# short for the fingerprint to mean anything
+def simhash(text):
+    tokens = re.findall(r'\w+', normalize_persian(text or ""))
+    if len(tokens) < SIMHASH_MIN_TOKENS:
+        return None
+    weights = [0] * SIMHASH_BITS
+    for token in tokens:
+        value = int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(SIMHASH_BITS):
+            weights[bit] += 1 if value >> bit & 1 else -1
+    return sum(1 << bit for bit in range(SIMHASH_BITS) if weights[bit] > 0)
+
+# SQLite integers are signed 64-bit; fingerprints are stored in that range
+def to_signed64(value):
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+# (band number, band value) pairs of a fingerprint; bands are as even as the bits allow
+def simhash_bands(fingerprint):
+    bands = []
+    start = 0
+    for band in range(SIMHASH_BANDS):
+        width = SIMHASH_BITS // SIMHASH_BANDS + (band < SIMHASH_BITS % SIMHASH_BANDS)
+        bands.append((band, fingerprint >> start & ((1 << width) - 1)))
+        start += width
+    return bands
+
+def store_simhash_bands(cursor, news_id, fingerprint):
+    cursor.executemany(
+        "INSERT OR IGNORE INTO news_simhash_bands (band, value, news_id) VALUES (?, ?, ?)",
+        [(band, value, news_id) for band, value in simhash_bands(fingerprint)]
+    )
+
+# Id of a stored article whose fingerprint is within SIMHASH_MAX_DISTANCE bits, or None
+def find_near_duplicate(cursor, fingerprint):
+    candidates = {}
+    for band, value in simhash_bands(fingerprint):
+        candidates.update(cursor.execute("""
+            SELECT news.id, news.simhash FROM news_simhash_bands
+            JOIN news ON news.id = news_simhash_bands.news_id
+            WHERE news_simhash_bands.band = ? AND news_simhash_bands.value = ?
+        """, (band, value)).fetchall())
+    for news_id in sorted(candidates):
+        stored = candidates[news_id]
+        if stored is not None and bin((stored & ((1 << 64) - 1)) ^ fingerprint).count("1") <= SIMHASH_MAX_DISTANCE:
+            return news_id
+    return None
+
+# Store an article once, whatever topic it was found under: match it by source URL (its
+# own or an alias), then by near-duplicate text, and only insert when neither matches.
+# A near-duplicate match records the URL as an alias of the article. Changed text is
+# rewritten for matches of the article's own URL only, so two near-identical versions
+# of a story cannot overwrite each other on every run. The topic is added to the
+# article's categories. Returns True when anything was actually written.
+def upsert_article(cursor, title, body, source_url, category, digest=None, fingerprint=None, image_url=None):
+    # Callers that fingerprinted the article elsewhere (the scraper's parse processes)
+    # pass digest and fingerprint along; empty text has no fingerprint either way
+    if digest is None:
+        digest = content_hash(title, body)
+        fingerprint = simhash(f"{title} {body}")
+    signed = to_signed64(fingerprint) if fingerprint is not None else None
+    written = False
+    
+    row = cursor.execute("SELECT id, content_hash, image_url FROM news WHERE source_url = ?", (source_url,)).fetchone()
+    if row is not None:
+        news_id, stored_hash, stored_image_url = row
+        # A new lead image replaces the thumbnail on the next thumbnail run
+        if image_url and image_url != stored_image_url:
+            cursor.execute("UPDATE news SET image_url = ? WHERE id = ?", (image_url, news_id))
+            cursor.execute("DELETE FROM news_thumbnails WHERE news_id = ?", (news_id,))
+            written = True
+        if stored_hash != digest:
+            cursor.execute(
+                "UPDATE news SET title = ?, body = ?, content_hash = ?, simhash = ? WHERE id = ?",
+                (title, body, digest, signed, news_id)
+            )
+            cursor.execute("DELETE FROM news_simhash_bands WHERE news_id = ?", (news_id,))
+            if fingerprint is not None:
+                store_simhash_bands(cursor, news_id, fingerprint)
+            written = True
+    else:
+        alias = cursor.execute("SELECT news_id FROM news_aliases WHERE source_url = ?", (source_url,)).fetchone()
+        if alias is not None:
+            news_id = alias[0]
+        else:
+            news_id = find_near_duplicate(cursor, fingerprint) if fingerprint is not None else None
+            if news_id is not None:
+                cursor.execute("INSERT INTO news_aliases (source_url, news_id) VALUES (?, ?)", (source_url, news_id))
+        if news_id is None:
+            cursor.execute(
+                "INSERT INTO news (title, body, source_url, category, content_hash, simhash, image_url) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (title, body, source_url, category, digest, signed, image_url)
+            )
+            news_id = cursor.lastrowid
+            if fingerprint is not None:
+                store_simhash_bands(cursor, news_id, fingerprint)
+            written = True
+    
+    cursor.execute("""
+        INSERT OR IGNORE INTO news_categories (news_id, category, timestamp)
+        SELECT id, ?, timestamp FROM news WHERE id = ?
+    """, (category, news_id))
+    return written or cursor.rowcount > 0
+
+# Staging area of one scrape run: a TEMP table on the writer connection. Parsed pages
+# collect there while the crawl runs and reach news in a single transaction, so
+# readers see either the previous data or the whole run, never part of it.
+STAGED_NEWS_TABLE = "CREATE TEMP TABLE IF NOT EXISTS staged_news (title TEXT, body TEXT, source_url TEXT, category TEXT, image_url TEXT, content_hash TEXT, simhash INTEGER)"
+STAGED_PAGES_TABLE = "CREATE TEMP TABLE IF NOT EXISTS staged_pages (url TEXT PRIMARY KEY, body_sha256 TEXT NOT NULL)"
+
+# Add (title, body, source_url, category[, image_url]) rows, or rows extended with
+# fingerprint_article's (content_hash, simhash), in one transaction, together with the
+# (url, body_sha256) of the listing pages they came from
+def stage_articles(db, rows, pages=()):
+    rows = [tuple(row) + (None,) * (7 - len(row)) for row in rows]
+    with db.writer() as conn:
+        conn.execute(STAGED_NEWS_TABLE)
+        conn.execute(STAGED_PAGES_TABLE)
+        conn.executemany("INSERT INTO temp.staged_news VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+        conn.executemany("INSERT OR REPLACE INTO temp.staged_pages VALUES (?, ?)", pages)
+
+# Drop whatever an earlier, interrupted run left staged
+def discard_staged_articles(db):
+    with db.writer() as conn:
+        conn.execute("DROP TABLE IF EXISTS temp.staged_news")
+        conn.execute("DROP TABLE IF EXISTS temp.staged_pages")
+
+# Content hash and signed SimHash of an article, as staged. Computed where the page
+# is parsed, so the merge does no hashing of its own.
+def fingerprint_article(title, body):
+    fingerprint = simhash(f"{title} {body}")
+    return content_hash(title, body), to_signed64(fingerprint) if fingerprint is not None else None
+
+# Upsert everything staged in one transaction, bumping the generation when anything
+# changed, and empty the staging table. Returns {category: articles written}.
+def merge_staged_articles(db):
+    changed = {}
+    with db.writer() as conn:
+        conn.execute(STAGED_NEWS_TABLE)
+        cursor = conn.cursor()
+        # Read in chunks, so a deep backfill is never held in memory at once
+        staged = conn.execute("SELECT title, body, source_url, category, image_url, content_hash, simhash FROM temp.staged_news ORDER BY rowid")
+        for title, body, source_url, category, image_url, digest, signed in itertools.chain.from_iterable(iter(lambda: staged.fetchmany(500), [])):
+            fingerprint = signed & (1 << 64) - 1 if signed is not None else None
+            if upsert_article(cursor, title, body, source_url, category, digest, fingerprint, image_url):
+                changed[category] = changed.get(category, 0) + 1
+        # The pages count as stored only once their articles are
+        conn.execute(STAGED_PAGES_TABLE)
+        conn.execute("""
+            INSERT OR REPLACE INTO listing_pages (url, body_sha256, stored_at)
+            SELECT url, body_sha256, CURRENT_TIMESTAMP FROM temp.staged_pages
+        """)
+        # Invalidate cached reads in the same commit as the new data
+        if changed:
+            bump_generation(conn)
+        conn.execute("DELETE FROM temp.staged_news")
+        conn.execute("DELETE FROM temp.staged_pages")
+    return changed
+
+# SHA-256 of the body last merged from a listing page, or None when it never was
+def stored_listing_hash(db, url):
+    with db.reader() as conn:
+        row = conn.execute("SELECT body_sha256 FROM listing_pages WHERE url = ?", (url,)).fetchone()
+    return row[0] if row else None
+
+# Subset of the given source URLs that are already stored, as an article's own URL or
+# as an alias, optionally only those already listed under the given category
+def known_source_urls(db, source_urls, category=None):
+    source_urls = list(source_urls)
+    known = set()
+    with db.reader() as conn:
+        # Stay well below SQLite's bound-parameter limit; every URL is bound twice
+        for start in range(0, len(source_urls), 400):
+            chunk = source_urls[start:start + 400]
+            placeholders = ", ".join("?" * len(chunk))
+            if category:
+                rows = conn.execute(f"""
+                    SELECT news.source_url FROM news
+                    JOIN news_categories ON news_categories.news_id = news.id
+                    WHERE news.source_url IN ({placeholders}) AND news_categories.category = ?
+                    UNION ALL
+                    SELECT news_aliases.source_url FROM news_aliases
+                    JOIN news_categories ON news_categories.news_id = news_aliases.news_id
+                    WHERE news_aliases.source_url IN ({placeholders}) AND news_categories.category = ?
+                """, chunk + [category] + chunk + [category])
+            else:
+                rows = conn.execute(f"""
+                    SELECT source_url FROM news WHERE source_url IN ({placeholders})
+                    UNION ALL
+                    SELECT source_url FROM news_aliases WHERE source_url IN ({placeholders})
+                """, chunk + chunk)
+            known.update(row[0] for row in rows)
+    return known
+
+# Compress article text for storage; returns (codec, blob)
+def compress_text(text):
+    data = text.encode("utf-8")
+    if zstandard is not None:
+        return "zstd", zstandard.ZstdCompressor(level=10).compress(data)
+    return "zlib", zlib.compress(data, 6)
+
+def decompress_text(codec, blob):
+    if blob is None:
+        return None
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read this article text")
+        return zstandard.ZstdDecompressor().decompress(blob).decode("utf-8")
+    return zlib.decompress(blob).decode("utf-8")
+
+# Newest articles whose full text has not been fetched yet. Articles without their
+# own page (fallback URLs with a #fragment) are skipped.
+def articles_missing_content(db, limit):
+    with db.reader() as conn:
+        return conn.execute("""
+            SELECT id, source_url FROM news
+            WHERE NOT EXISTS (SELECT 1 FROM news_content WHERE news_content.news_id = news.id)
+              AND instr(source_url, '#') = 0
+            ORDER BY id DESC
+            LIMIT ?
+        """, (limit,)).fetchall()
+
+# Store the full text of an article; None records that nothing could be extracted
+def store_article_content(conn, news_id, text):
+    codec, blob = compress_text(text) if text else ("none", None)
+    conn.execute(
+        "INSERT OR REPLACE INTO news_content (news_id, codec, content) VALUES (?, ?, ?)",
+        (news_id, codec, blob)
+    )
+
+# Newest articles with a lead image but no thumbnail yet
+def articles_missing_thumbnail(db, limit):
+    with db.reader() as conn:
+        return conn.execute("""
+            SELECT id, image_url FROM news
+            WHERE image_url IS NOT NULL
+              AND NOT EXISTS (SELECT 1 FROM news_thumbnails WHERE news_thumbnails.news_id = news.id)
+            ORDER BY id DESC
+            LIMIT ?
+        """, (limit,)).fetchall()
+
+# (news_id, thumbnail key) of the newest articles that have a thumbnail stored
+def stored_thumbnails(db, limit):
+    with db.reader() as conn:
+        return conn.execute(
+            "SELECT news_id, thumbnail FROM news_thumbnails WHERE thumbnail IS NOT NULL ORDER BY news_id DESC LIMIT ?",
+            (limit,)
+        ).fetchall()
+
+# Forget the thumbnails of articles whose file was evicted from the thumbnail cache, so
+# the next thumbnail run downloads them again
+def requeue_thumbnails(db, news_ids):
+    with db.writer() as conn:
+        conn.executemany(
+            "DELETE FROM news_thumbnails WHERE news_id = ? AND thumbnail IS NOT NULL",
+            [(news_id,) for news_id in news_ids]
+        )
+
+# Record (news_id, thumbnail key or None) pairs in one transaction. Cards show the
+# thumbnails, so cached pages are invalidated when any was stored.
+def store_thumbnails(db, thumbnails):
+    with db.writer() as conn:
+        conn.executemany("INSERT OR REPLACE INTO news_thumbnails (news_id, thumbnail) VALUES (?, ?)", thumbnails)
+        if any(thumbnail for news_id, thumbnail in thumbnails):
+            bump_generation(conn)
+
+# Full text of one article, or None if it is not available
+def query_article_content(db, news_id):
+    with db.reader() as conn:
+        row = conn.execute("SELECT codec, content FROM news_content WHERE news_id = ?", (news_id,)).fetchone()
+    return decompress_text(*row) if row else None
+
+# Mark a scrape as running so every UI session can show it
+def mark_scrape_started(db):
+    with db.writer() as conn:
+        conn.execute("""
+            UPDATE scrape_status
+            SET in_progress = 1, started_at = CURRENT_TIMESTAMP, last_error = NULL
+            WHERE id = 1
+        """)
+
+# Record the end of a scrape; finished_at is the "last updated" time shown in the UI.
+# fetch_seconds/parse_seconds are summed over all pages of the run.
+def mark_scrape_finished(db, articles_changed, error=None, fetch_seconds=None, parse_seconds=None):
+    with db.writer() as conn:
+        conn.execute("""
+            UPDATE scrape_status
+            SET in_progress = 0, finished_at = CURRENT_TIMESTAMP,
+                articles_changed = ?, last_error = ?,
+                fetch_seconds = ?, parse_seconds = ?
+            WHERE id = 1
+        """, (articles_changed, error, fetch_seconds, parse_seconds))
+
+# Current scraper status as a dict. A run that has been "in progress" for longer
+# than SCRAPE_STALE_AFTER belongs to a process that died and is reported as idle.
+def get_scrape_status(db):
+    with db.reader() as conn:
+        row = conn.execute("""
+            SELECT in_progress AND started_at > datetime('now', ?),
+                   started_at, finished_at, articles_changed, last_error,
+                   fetch_seconds, parse_seconds
+            FROM scrape_status WHERE id = 1
+        """, (f"-{SCRAPE_STALE_AFTER} seconds",)).fetchone()
+    if not row:
+        row = (0, None, None, None, None, None, None)
+    return {
+        "in_progress": bool(row[0]),
+        "started_at": row[1],
+        "finished_at": row[2],
+        "articles_changed": row[3],
+        "last_error": row[4],
+        "fetch_seconds": row[5],
+        "parse_seconds": row[6],
+    }
+
+# Move articles past their retention into monthly archive tables news_archive_YYYY_MM,
+# together with their categories and full text. An article stays as long as any of
+# its categories still keeps it. The news_archive view unions all archive tables so
+# history stays queryable. Returns the number of archived articles.
+def archive_old_news(db, retention_days=RETENTION_DAYS, category_retention=None):
+    category_retention = category_retention or {}
+    shortest = min([retention_days, *category_retention.values()])
+    
+    with db.writer() as conn:
+        cursor = conn.cursor()
+        cursor.execute("CREATE TEMP TABLE IF NOT EXISTS retention_policy (category TEXT PRIMARY KEY, days INTEGER)")
+        cursor.execute("DELETE FROM temp.retention_policy")
+        cursor.executemany("INSERT INTO temp.retention_policy VALUES (?, ?)", category_retention.items())
+        
+        cursor.execute("CREATE TEMP TABLE IF NOT EXISTS expired_news (id INTEGER PRIMARY KEY, bucket TEXT)")
+        cursor.execute("DELETE FROM temp.expired_news")
+        cursor.execute("""
+            INSERT INTO temp.expired_news (id, bucket)
+            SELECT news.id, strftime('%Y_%m', news.timestamp) FROM news
+            WHERE news.timestamp < datetime('now', ?)
+            AND NOT EXISTS (
+                SELECT 1 FROM news_categories
+                LEFT JOIN temp.retention_policy ON retention_policy.category = news_categories.category
+                WHERE news_categories.news_id = news.id
+                AND news_categories.timestamp >= datetime('now', '-' || COALESCE(retention_policy.days, ?) || ' days')
+            )
+        """, (f"-{shortest} days", retention_days))
+        
+        buckets = [row[0] for row in cursor.execute("SELECT DISTINCT bucket FROM temp.expired_news WHERE bucket IS NOT NULL")]
+        for bucket in buckets:
+            table = f"news_archive_{bucket}"
+            cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                id INTEGER PRIMARY KEY,
+                title TEXT NOT NULL,
+                body TEXT,
+                source_url TEXT,
+                category TEXT,
+                categories TEXT,
+                timestamp DATETIME,
+                content_codec TEXT,
+                content BLOB,
+                archived_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+            """)
+            cursor.execute(f"""
+                INSERT OR REPLACE INTO {table} (id, title, body, source_url, category, categories, timestamp, content_codec, content)
+                SELECT news.id, news.title, news.body, news.source_url, news.category,
+                    (SELECT group_concat(category, ', ') FROM news_categories WHERE news_id = news.id),
+                    news.timestamp, news_content.codec, news_content.content
+                FROM temp.expired_news
+                JOIN news ON news.id = expired_news.id
+                LEFT JOIN news_content ON news_content.news_id = news.id
+                WHERE expired_news.bucket = ?
+            """, (bucket,))
+        
+        # Triggers remove categories, full text, search entries and SimHash bands
+        cursor.execute("DELETE FROM news WHERE id IN (SELECT id FROM temp.expired_news)")
+        archived = cursor.rowcount
+        if archived:
+            bump_generation(conn)
+        if buckets:
+            tables = [row[0] for row in cursor.execute(
+                "SELECT name FROM sqlite_master WHERE type='table' AND name GLOB 'news_archive_[0-9]*' ORDER BY name"
+            )]
+            cursor.execute("DROP VIEW IF EXISTS news_archive")
+            cursor.execute("CREATE VIEW news_archive AS " + " UNION ALL ".join(f"SELECT * FROM {table}" for table in tables))
+    return archived
+
+# Periodic upkeep of a persistent database: archive expired articles, return free pages
+# to the file system and refresh query planner statistics. Runs at most once per
+# MAINTENANCE_INTERVAL across all processes unless force is set. Returns the number of
+# archived articles, or None when skipped.
+def maintain_database(db, retention_days=RETENTION_DAYS, category_retention=None, force=False):
+    with db.reader() as conn:
+        row = conn.execute("SELECT value FROM app_meta WHERE key = 'maintained_at'").fetchone()
+    if not force and row and time.time() - row[0] < MAINTENANCE_INTERVAL:
+        return None
+    
+    archived = archive_old_news(db, retention_days, CATEGORY_RETENTION_DAYS if category_retention is None else category_retention)
+    
+    with db.writer() as conn:
+        conn.execute(
+            "DELETE FROM news_text_changes WHERE changed_at < datetime('now', ?)",
+            (f"-{TEXT_CHANGES_RETENTION_DAYS} days",)
+        )
+        conn.execute("""
+            INSERT INTO app_meta (key, value) VALUES ('maintained_at', ?)
+            ON CONFLICT(key) DO UPDATE SET value = excluded.value
+        """, (int(time.time()),))
+    
+    # VACUUM and incremental_vacuum cannot run inside a transaction
+    with db.writer() as conn:
+        conn.commit()
+        isolation_level = conn.isolation_level
+        conn.isolation_level = None
+        try:
+            # Files created before auto_vacuum was enabled need one full VACUUM to switch
+            if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+                conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+                conn.execute("VACUUM")
+            conn.execute("PRAGMA incremental_vacuum").fetchall()
+            conn.execute("PRAGMA optimize")
+        finally:
+            conn.isolation_level = isolation_level
+    return archived
+
+# Number of articles, optionally within one category
+def query_news_count(db, category=None):
+    with db.reader() as conn:
+        row = conn.execute("SELECT articles FROM category_facets WHERE category = ?", (category or "",)).fetchone()
+        return row[0] if row else 0
+
+# Categories that currently have articles
+def query_categories(db):
+    return tuple(category for category, articles, latest in query_category_facets(db))
+
+# (category, article count, newest timestamp) of every category with articles
+def query_category_facets(db):
+    with db.reader() as conn:
+        return tuple(conn.execute("""
+            SELECT category, articles, latest FROM category_facets
+            WHERE category != '' AND articles > 0
+            ORDER BY category
+        """).fetchall())
+
+# Turn free text into an FTS5 query: every normalized word must match, as a
+# prefix so partially typed words still find results
+def build_search_query(search_term):
+    tokens = re.findall(r'\w+', normalize_persian(search_term))
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+# Ranked full-text search: one page of results plus the total match count
+def query_search(db, match, category, page, per_page):
+    where = "news_fts MATCH ?"
+    params = [match]
+    if category:
+        where += " AND news.id IN (SELECT news_id FROM news_categories WHERE category = ?)"
+        params.append(category)
+    
+    with db.reader() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT COUNT(*) FROM news_fts JOIN news ON news.id = news_fts.rowid WHERE {where}", params)
+        total = cursor.fetchone()[0]
+        
+        # Title matches weigh twice as much as body matches in the bm25 ranking
+        cursor.execute(f"""
+            SELECT news.title, news.body, news.source_url, news.category, news.timestamp, news.id,
+                (SELECT thumbnail FROM news_thumbnails WHERE news_id = news.id)
+            FROM news_fts JOIN news ON news.id = news_fts.rowid
+            WHERE {where}
+            ORDER BY bm25(news_fts, 2.0, 1.0)
+            LIMIT ? OFFSET ?
+        """, params + [per_page, (page - 1) * per_page])
+        
+        results = tuple(cursor.fetchall())
+    return results, total
+
+# One page of the news list, seeking past the (timestamp, id) cursor when given.
+# A category page walks idx_news_categories_category_timestamp and shows that category
+# on the cards; the full list walks idx_news_timestamp.
+def query_news_page(db, category, after, offset, per_page):
+    if category:
+        table = "news_categories JOIN news ON news.id = news_categories.news_id"
+        columns = "news.title, news.body, news.source_url, news_categories.category, news_categories.timestamp, news_categories.news_id, (SELECT thumbnail FROM news_thumbnails WHERE news_id = news.id)"
+        order = "news_categories.timestamp DESC, news_categories.news_id DESC"
+        where = ["news_categories.category = ?"]
+        params = [category]
+        if after:
+            where.append("(news_categories.timestamp, news_categories.news_id) < (?, ?)")
+            params.extend(after)
+    else:
+        table = "news"
+        columns = "title, body, source_url, category, timestamp, id, (SELECT thumbnail FROM news_thumbnails WHERE news_id = news.id)"
+        order = "timestamp DESC, id DESC"
+        where = []
+        params = []
+        if after:
+            where.append("(timestamp, id) < (?, ?)")
+            params.extend(after)
+    where_clause = f"WHERE {' AND '.join(where)}" if where else ""
+    
+    with db.reader() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            SELECT {columns}
+            FROM {table}
+            {where_clause}
+            ORDER BY {order}
+            LIMIT ? OFFSET ?
+        """, params + [per_page, offset])
+        
+        return tuple(cursor.fetchall())
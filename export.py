@@ -0,0 +1,159 @@
+import argparse
+import csv
+import json
+import os
+import sys
+
+from database import DATABASE_PATH, DatabaseManager, decompress_text, schema_is_current
+
+# Parquet output needs pyarrow; NDJSON and CSV work without it
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+# Rows read per fetchmany call; also the Parquet row group size
+EXPORT_CHUNK_SIZE = 1000
+
+EXPORT_FORMATS = ("ndjson", "csv", "parquet")
+EXPORT_COLUMNS = ("id", "title", "body", "source_url", "category", "categories", "timestamp", "image_url")
+EXPORT_MIME_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+# Column names of an export, with the full text column when requested
+def export_columns(with_content=False):
+    return EXPORT_COLUMNS + ("content",) if with_content else EXPORT_COLUMNS
+
+# Stream articles as chunks of row tuples (see export_columns), oldest first. Filters:
+# category (any of the article's categories) and a [since, until) timestamp range in
+# any format SQLite's datetime() accepts. One read connection is held until the
+# generator is exhausted or closed, so the export sees a single consistent snapshot.
+def iter_news(db, category=None, since=None, until=None, with_content=False, chunk_size=EXPORT_CHUNK_SIZE):
+    where = []
+    params = []
+    if category:
+        where.append("news.id IN (SELECT news_id FROM news_categories WHERE category = ?)")
+        params.append(category)
+    if since:
+        where.append("news.timestamp >= datetime(?)")
+        params.append(since)
+    if until:
+        where.append("news.timestamp < datetime(?)")
+        params.append(until)
+    where_clause = f"WHERE {' AND '.join(where)}" if where else ""
+    content_columns = ", news_content.codec, news_content.content" if with_content else ""
+    content_join = "LEFT JOIN news_content ON news_content.news_id = news.id" if with_content else ""
+    
+    with db.reader() as conn:
+        cursor = conn.execute(f"""
+            SELECT news.id, news.title, news.body, news.source_url, news.category,
+                (SELECT group_concat(category, ', ') FROM news_categories WHERE news_id = news.id),
+                news.timestamp, news.image_url{content_columns}
+            FROM news
+            {content_join}
+            {where_clause}
+            ORDER BY news.id
+        """, params)
+        try:
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                if with_content:
+                    rows = [row[:-2] + (decompress_text(row[-2], row[-1]) if row[-2] else None,) for row in rows]
+                yield rows
+        finally:
+            cursor.close()
+
+def write_ndjson(chunks, f, columns):
+    count = 0
+    for rows in chunks:
+        for row in rows:
+            f.write(json.dumps(dict(zip(columns, row)), ensure_ascii=False))
+            f.write("\n")
+        count += len(rows)
+    return count
+
+def write_csv(chunks, f, columns):
+    writer = csv.writer(f)
+    writer.writerow(columns)
+    count = 0
+    for rows in chunks:
+        writer.writerows(rows)
+        count += len(rows)
+    return count
+
+# One row group per chunk; f is a path or a binary file object
+def write_parquet(chunks, f, columns):
+    if pyarrow is None:
+        raise RuntimeError("Parquet export needs pyarrow (pip install pyarrow)")
+    schema = pyarrow.schema([
+        (name, pyarrow.int64() if name == "id" else pyarrow.string()) for name in columns
+    ])
+    count = 0
+    with pyarrow.parquet.ParquetWriter(f, schema) as writer:
+        for rows in chunks:
+            table = pyarrow.Table.from_pylist([dict(zip(columns, row)) for row in rows], schema=schema)
+            writer.write_table(table)
+            count += len(rows)
+    return count
+
+# Write an export to f: a text file for ndjson/csv (opened with newline=""), a path or
+# binary file for parquet. Returns the number of exported articles.
+def export_news(db, f, format="ndjson", category=None, since=None, until=None, with_content=False, chunk_size=EXPORT_CHUNK_SIZE):
+    writers = {"ndjson": write_ndjson, "csv": write_csv, "parquet": write_parquet}
+    if format not in writers:
+        raise ValueError(f"unknown export format {format!r}, expected one of {', '.join(EXPORT_FORMATS)}")
+    chunks = iter_news(db, category, since, until, with_content, chunk_size)
+    try:
+        return writers[format](chunks, f, export_columns(with_content))
+    finally:
+        chunks.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stream the news table as NDJSON, CSV or Parquet")
+    parser.add_argument("--db", default=DATABASE_PATH, help="SQLite database file to export from")
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default="ndjson", help="output format")
+    parser.add_argument("--output", default="-", help="output file ('-' writes ndjson/csv to stdout)")
+    parser.add_argument("--category", help="only articles listed under this category")
+    parser.add_argument("--since", help="only articles stored at or after this time, e.g. 2024-01-01")
+    parser.add_argument("--until", help="only articles stored before this time")
+    parser.add_argument("--content", action="store_true", help="include the full article text")
+    parser.add_argument("--chunk-size", type=int, default=EXPORT_CHUNK_SIZE, help="rows read per batch")
+    args = parser.parse_args(argv)
+    
+    if args.format == "parquet" and args.output == "-":
+        parser.error("parquet output needs --output")
+    
+    # Exporting never creates or migrates a database
+    if not os.path.isfile(args.db):
+        parser.error(f"--db {args.db!r} does not exist")
+    if not schema_is_current(args.db):
+        parser.error(f"--db {args.db!r} is not a database of this version; open it with the app or the scraper first")
+    
+    db = DatabaseManager(args.db, read_only=True)
+    try:
+        # datetime() turns what it cannot parse into NULL, which would match nothing
+        with db.reader() as conn:
+            for option in ("since", "until"):
+                value = getattr(args, option)
+                if value and conn.execute("SELECT datetime(?) IS NULL", (value,)).fetchone()[0]:
+                    parser.error(f"--{option} expects a date or time SQLite understands, e.g. 2024-01-01, got {value!r}")
+        options = dict(category=args.category, since=args.since, until=args.until, with_content=args.content, chunk_size=args.chunk_size)
+        if args.format == "parquet":
+            count = export_news(db, args.output, args.format, **options)
+        elif args.output == "-":
+            count = export_news(db, sys.stdout, args.format, **options)
+        else:
+            with open(args.output, "w", encoding="utf-8", newline="") as f:
+                count = export_news(db, f, args.format, **options)
+    finally:
+        db.close()
+    print(f"Exported {count} articles", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
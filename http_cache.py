@@ -0,0 +1,154 @@
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+
+from atomic_file import write_atomic
+
+# On-disk cache settings: directory, seconds a page is trusted without asking the
+# server again, and age after which unused entries are pruned
+HTTP_CACHE_DIR = '.http_cache'
+HTTP_CACHE_TTL = 120
+HTTP_CACHE_MAX_AGE = 7 * 24 * 3600
+
+# What the scraper needs from a page fetch, whether it came from the network or the cache.
+# unchanged is set when the page is known to be identical to the last fetch (fresh
+# entry, 304 Not Modified or same body hash). The cache does not know whether that
+# fetch was ever stored, so callers compare body_sha256 with what they recorded before
+# skipping any work.
+class CachedResponse:
+    def __init__(self, url, status_code, content, encoding=None, unchanged=False, source="network", body_sha256=None):
+        self.url = url
+        self.status_code = status_code
+        self.content = content
+        self.encoding = encoding or "utf-8"
+        self.unchanged = unchanged
+        self.source = source
+        self.body_sha256 = body_sha256
+    
+    @property
+    def text(self):
+        return self.content.decode(self.encoding, errors="replace")
+
+# Content-addressed HTTP cache: one small JSON entry per URL pointing at a gzip body
+# named by its SHA-256. Identical bodies are stored once. With offline=True nothing
+# goes to the network and cached pages are replayed as ordinary responses.
+class HttpCache:
+    def __init__(self, directory=HTTP_CACHE_DIR, ttl=HTTP_CACHE_TTL, offline=False):
+        self.directory = directory
+        self.ttl = ttl
+        self.offline = offline
+        self._lock = threading.Lock()
+        os.makedirs(os.path.join(directory, "entries"), exist_ok=True)
+        os.makedirs(os.path.join(directory, "bodies"), exist_ok=True)
+    
+    def _entry_path(self, url):
+        return os.path.join(self.directory, "entries", hashlib.sha256(url.encode("utf-8")).hexdigest() + ".json")
+    
+    def _body_path(self, digest):
+        return os.path.join(self.directory, "bodies", digest + ".gz")
+    
+    def _load_entry(self, url):
+        try:
+            with open(self._entry_path(url), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+    
+    def _load_body(self, entry):
+        try:
+            with gzip.open(self._body_path(entry["body_sha256"]), "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+    
+    def _store(self, url, content, encoding, etag, last_modified):
+        digest = hashlib.sha256(content).hexdigest()
+        body_path = self._body_path(digest)
+        if not os.path.exists(body_path):
+            write_atomic(body_path, gzip.compress(content, 6))
+        entry = {
+            "url": url,
+            "etag": etag,
+            "last_modified": last_modified,
+            "encoding": encoding,
+            "body_sha256": digest,
+            "fetched_at": time.time(),
+        }
+        write_atomic(self._entry_path(url), json.dumps(entry).encode("utf-8"))
+        return digest
+    
+    def _cached(self, url, entry, unchanged, source):
+        content = self._load_body(entry)
+        if content is None:
+            return None
+        return CachedResponse(url, 200, content, entry.get("encoding"), unchanged, source, entry["body_sha256"])
+    
+    # Fetch url through the cache. Returns a CachedResponse; see its unchanged flag.
+    def get(self, session, url, timeout):
+        entry = self._load_entry(url)
+        
+        if self.offline:
+            cached = self._cached(url, entry, False, "replay") if entry else None
+            # Never recorded: answer like a page that does not exist
+            return cached or CachedResponse(url, 404, b"", source="replay")
+        
+        if entry and time.time() - entry["fetched_at"] < self.ttl:
+            cached = self._cached(url, entry, True, "fresh")
+            if cached is not None:
+                return cached
+        
+        # Revalidate with the validators from the previous answer
+        headers = {}
+        if entry and entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry and entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        response = session.get(url, headers=headers, timeout=timeout)
+        
+        if response.status_code == 304 and entry:
+            cached = self._cached(url, entry, True, "not_modified")
+            if cached is not None:
+                entry["fetched_at"] = time.time()
+                write_atomic(self._entry_path(url), json.dumps(entry).encode("utf-8"))
+                return cached
+            # Body file lost: fetch again without validators
+            response = session.get(url, timeout=timeout)
+        
+        if response.status_code != 200:
+            return CachedResponse(url, response.status_code, response.content, response.encoding)
+        
+        digest = self._store(url, response.content, response.encoding, response.headers.get("ETag"), response.headers.get("Last-Modified"))
+        unchanged = bool(entry) and entry.get("body_sha256") == digest
+        return CachedResponse(url, 200, response.content, response.encoding, unchanged, "same_body" if unchanged else "network", digest)
+    
+    # Forget a URL, e.g. when its content could not be stored, so the next run processes it again
+    def invalidate(self, url):
+        try:
+            os.remove(self._entry_path(url))
+        except OSError:
+            pass
+    
+    # Remove entries not refreshed within max_age and bodies no entry points to
+    def prune(self, max_age=HTTP_CACHE_MAX_AGE):
+        with self._lock:
+            referenced = set()
+            entries_dir = os.path.join(self.directory, "entries")
+            for name in os.listdir(entries_dir):
+                path = os.path.join(entries_dir, name)
+                try:
+                    with open(path, encoding="utf-8") as f:
+                        entry = json.load(f)
+                except (OSError, ValueError):
+                    continue
+                if time.time() - entry.get("fetched_at", 0) > max_age:
+                    os.remove(path)
+                else:
+                    referenced.add(entry.get("body_sha256"))
+            
+            bodies_dir = os.path.join(self.directory, "bodies")
+            for name in os.listdir(bodies_dir):
+                if name.endswith(".gz") and name[:-3] not in referenced:
+                    os.remove(os.path.join(bodies_dir, name))
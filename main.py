@@ -1,47 +1,81 @@
-import requests
-import sqlite3
 import streamlit as st
-from bs4 import BeautifulSoup
+import html
 import os
 import atexit
 import time
-import signal
+import io
+import tempfile
 
-# Initialize database with proper table structure and cleanup on exit
-def init_database():
-    # Register cleanup function
-    atexit.register(cleanup_database)
-    
-    conn = sqlite3.connect('data.db', check_same_thread=False)
-    cursor = conn.cursor()
-    
-    # Create news table if it doesn't exist with proper columns
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS news (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        title TEXT NOT NULL,
-        body TEXT,
-        source_url TEXT,
-        category TEXT,
-        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-    )
-    """)
-    
-    # Create index for better search performance
-    cursor.execute("CREATE INDEX IF NOT EXISTS idx_news_category ON news(category)")
-    cursor.execute("CREATE INDEX IF NOT EXISTS idx_news_title ON news(title)")
-    
-    conn.commit()
-    conn.close()
+from database import (
+    RETENTION_DAYS,
+    DatabaseManager,
+    QueryCache,
+    build_search_query,
+    cleanup_database,
+    get_scrape_status,
+    maintain_database,
+    query_category_facets,
+    query_news_count,
+    query_article_content,
+    query_news_page,
+    query_search,
+)
+from export import EXPORT_FORMATS, EXPORT_MIME_TYPES, export_news, pyarrow
+from metrics import METRICS
+from news_cards import render_news_cards
+from http_cache import HttpCache
+from scraper import create_http_session, run_scrape, start_enrichment
+from search_index import PrefixIndex
+from thumbnail_cache import ThumbnailCache
+
+# Set DIGIATO_BACKGROUND_SCRAPER=1 when `python -m scraper` keeps the database up to
+# date. The UI then only reads: the fetch buttons are hidden and the shared database
+# is not removed when the app exits.
+BACKGROUND_SCRAPER = os.environ.get("DIGIATO_BACKGROUND_SCRAPER") == "1"
+
+# Set DIGIATO_PERSISTENT=1 to keep data.db across restarts when the UI scrapes by
+# itself. Articles older than DIGIATO_RETENTION_DAYS are then moved to the archive
+# tables during maintenance after a scrape.
+PERSISTENT_DATABASE = BACKGROUND_SCRAPER or os.environ.get("DIGIATO_PERSISTENT") == "1"
+RETENTION = int(os.environ.get("DIGIATO_RETENTION_DAYS", RETENTION_DAYS))
+
+# Set DIGIATO_ADMIN_PANEL=1 to show the stage metrics panel in the sidebar
+ADMIN_PANEL = os.environ.get("DIGIATO_ADMIN_PANEL") == "1"
+
+# Open the database once per process and share it between all sessions
+@st.cache_resource
+def get_database():
+    db = DatabaseManager()
+    # atexit runs handlers in reverse order: connections are closed before the files are removed
+    if not PERSISTENT_DATABASE:
+        atexit.register(cleanup_database)
+    atexit.register(db.close)
+    return db
+
+# One result cache shared by all sessions of this process
+@st.cache_resource
+def get_query_cache():
+    return QueryCache()
 
-# Cleanup database when app exits
-def cleanup_database():
-    try:
-        if os.path.exists('data.db'):
-            os.remove('data.db')
-            print("Database cleaned up successfully")
-    except Exception as e:
-        print(f"Error cleaning up database: {e}")
+# Serve a read query from the result cache, running it only on a miss
+def cached_query(name, compute, *args):
+    db = get_database()
+    return get_query_cache().get_or_compute(db.generation(), (name,) + args, lambda: compute(db, *args))
+
+# Shared HTTP session so TCP/TLS connections are pooled and reused across reruns
+@st.cache_resource
+def get_http_session():
+    return create_http_session()
+
+# On-disk cache of listing pages; unchanged categories cost one conditional request
+@st.cache_resource
+def get_http_cache():
+    return HttpCache()
+
+# Local thumbnails of the articles' lead images, shared with the background scraper
+@st.cache_resource
+def get_thumbnail_cache():
+    return ThumbnailCache()
 
 # Custom CSS with animations and neon theme
 def load_css():
@@ -118,6 +152,15 @@ def load_css():
             overflow: hidden;
         }
         
+        .news-thumb {
+            display: block !important;
+            width: 100% !important;
+            max-height: 180px !important;
+            object-fit: cover !important;
+            border-radius: 6px !important;
+            margin-bottom: 1rem !important;
+        }
+        
         .news-container:hover {
             transform: translateY(-5px) !important;
             box-shadow: 0 0 25px rgba(100, 255, 218, 0.4) !important;
@@ -444,196 +487,201 @@ def load_css():
     </style>
     """, unsafe_allow_html=True)
 
+# Show scraper progress messages in the page
+def report_to_streamlit(level, message):
+    getattr(st, level)(message)
+
 def scrape_and_store_news():
-    # Initialize database first
-    init_database()
-    
-    conn = sqlite3.connect('data.db', check_same_thread=False)
-    cursor = conn.cursor()
-    
-    # Clear existing news data
-    cursor.execute("DELETE FROM news")
-    conn.commit()
-    
     with st.spinner('در حال دریافت اخبار از دیجیاتو...'):
         st.markdown('<div class="loading"></div>', unsafe_allow_html=True)
-        
-        # Categories to scrape
-        categories = [
-            {"url": "https://digiato.com/topic/tech", "name": "تکنولوژی"},
-            {"url": "https://digiato.com/topic/car", "name": "خودرو"},
-            {"url": "https://digiato.com/topic/science", "name": "علمی"},
-            {"url": "https://digiato.com/topic/business", "name": "کسب و کار"}
-        ]
-        
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
-        
-        for category in categories:
-            try:
-                st.info(f'دریافت اخبار {category["name"]}...')
-                response = requests.get(category["url"], headers=headers, timeout=15)
-                
-                if response.status_code == 200:
-                    soup = BeautifulSoup(response.text, 'html.parser')
-                    
-                    # Try different selectors for finding news items
-                    articles = soup.select("article") or soup.select(".post") or soup.select(".rowCard") or soup.select(".post-list .post-item")
-                    
-                    for article in articles:
-                        # Extract title
-                        title_elem = (
-                            article.select_one("h2 a") or 
-                            article.select_one("h3 a") or
-                            article.select_one(".post-title a") or
-                            article.select_one("a[class*='title']") or
-                            article.select_one(".entry-title a")
-                        )
-                        
-                        # Extract body
-                        body_elem = (
-                            article.select_one("p[class*='description']") or
-                            article.select_one("p[class*='excerpt']") or
-                            article.select_one(".post-excerpt") or
-                            article.select_one(".entry-content p") or
-                            article.select_one("p")
-                        )
-                        
-                        if title_elem and body_elem:
-                            title = title_elem.text.strip()
-                            body = body_elem.text.strip()
-                            
-                            # Get URL
-                            if title_elem.has_attr("href"):
-                                source_url = title_elem["href"]
-                            else:
-                                source_url = title_elem.parent.get("href") if title_elem.parent.name == "a" else None
-                            
-                            # Make URL absolute if needed
-                            if source_url and not source_url.startswith(('http://', 'https://')):
-                                source_url = f"https://digiato.com{source_url}" if not source_url.startswith('/') else f"https://digiato.com{source_url}"
-                            
-                            # Use default if no URL found
-                            if not source_url:
-                                source_url = category["url"]
-                            
-                            # Store in database
-                            cursor.execute(
-                                "INSERT INTO news (title, body, source_url, category) VALUES (?, ?, ?, ?)",
-                                (title, body, source_url, category["name"])
-                            )
-            except Exception as e:
-                st.error(f"خطا در دریافت اخبار {category['name']}: {str(e)}")
-        
-        conn.commit()
-    conn.close()
-    st.success("اخبار با موفقیت دریافت شدند! ✨")
+        changed = run_scrape(get_database(), get_http_session(), report=report_to_streamlit, http_cache=get_http_cache())
+        # Full text and thumbnails arrive in the background; the cards show them on a later rerun
+        start_enrichment(get_database(), get_http_session(), thumbnail_cache=get_thumbnail_cache())
+        if PERSISTENT_DATABASE:
+            maintain_database(get_database(), RETENTION)
+    st.success(f"اخبار با موفقیت دریافت شدند! ✨ ({changed} خبر جدید یا به‌روز شده)")
     time.sleep(1)  # For animation effect
 
 def get_news_count(category=None):
-    conn = sqlite3.connect('data.db', check_same_thread=False)
-    cursor = conn.cursor()
+    if not category or category == "همه":
+        category = None
+    return cached_query("news_count", query_news_count, category)
+
+# Article count per category, read from the trigger-maintained facet table
+def get_category_counts():
+    return {category: articles for category, articles, latest in cached_query("category_facets", query_category_facets)}
+
+# Prefix index of article words shared by all sessions, brought up to the current data
+# generation on use (new articles are added incrementally)
+@st.cache_resource
+def get_prefix_index():
+    return PrefixIndex()
+
+def current_prefix_index():
+    db = get_database()
+    index = get_prefix_index()
+    index.refresh(db, db.generation())
+    return index
+
+# Run a ranked full-text search and return one page of results plus the total match count
+def search_news(search_term, category=None, page=1, per_page=5):
+    match = build_search_query(search_term)
+    if not match:
+        return (), 0
+    # No article holds every word: answer without the database
+    if current_prefix_index().candidates(search_term) == set():
+        METRICS.increment("search_skipped_total")
+        return (), 0
+    
+    if not category or category == "همه":
+        category = None
+    return cached_query("search", query_search, match, category, page, per_page)
+
+def use_suggestion(suggestion):
+    st.session_state.search_input = suggestion
+    st.session_state.search_page = 1
+
+# Completions of the word being typed, from the in-memory prefix index
+def display_search_suggestions(search_term):
+    suggestions = current_prefix_index().suggest(search_term)
+    if not suggestions:
+        return
+    columns = st.columns(len(suggestions))
+    for i, (column, suggestion) in enumerate(zip(columns, suggestions)):
+        column.button(suggestion, key=f"suggestion_{i}", on_click=use_suggestion, args=(suggestion,))
+
+# Full text is read from the database only for the article the reader opens, so
+# list pages never load the compressed blobs
+def display_full_text_picker(rows, key):
+    titles = {row[5]: row[0] for row in rows}
+    news_id = st.selectbox(
+        "مطالعه متن کامل 📖",
+        options=[None] + list(titles),
+        format_func=lambda x: "یک خبر را انتخاب کنید" if x is None else titles[x],
+        key=key
+    )
+    if news_id is None:
+        return
     
-    if category and category != "همه":
-        cursor.execute("SELECT COUNT(*) FROM news WHERE category=?", (category,))
-    else:
-        cursor.execute("SELECT COUNT(*) FROM news")
+    text = query_article_content(get_database(), news_id)
+    if not text:
+        st.info("متن کامل این خبر هنوز دریافت نشده است. ⏳")
+        return
     
-    count = cursor.fetchone()[0]
-    conn.close()
-    return count
+    paragraphs = "".join(f"<p>{html.escape(paragraph)}</p>" for paragraph in text.split("\n\n"))
+    st.markdown(f"""
+    <div class="news-container">
+        <div class="news-title">{html.escape(titles[news_id])}</div>
+        <div class="news-body">{paragraphs}</div>
+    </div>
+    """, unsafe_allow_html=True)
+
+# Per-stage latency, row/byte and error counts of this app process, with exports for
+# monitoring. Scrapes run by the background service export their own metrics file.
+def display_admin_panel():
+    with st.sidebar.expander("متریک‌های عملکرد ⏱️", expanded=True):
+        summary = METRICS.summary()
+        if summary:
+            st.dataframe(summary, hide_index=True)
+        else:
+            st.caption("هنوز داده‌ای ثبت نشده است.")
+        st.download_button("Prometheus", METRICS.to_prometheus(), file_name="metrics.prom", mime="text/plain", key="metrics_prometheus")
+        st.download_button("JSON lines", METRICS.to_json_lines(), file_name="metrics.jsonl", mime="application/x-ndjson", key="metrics_jsonl")
+
+# Export the stored news for download. The file is built from the same chunked
+# generator as `python -m export`, spooled to a temporary file, and only when asked for.
+def display_export_panel(category):
+    with st.sidebar.expander("خروجی داده 📦"):
+        formats = [name for name in EXPORT_FORMATS if name != "parquet" or pyarrow is not None]
+        export_format = st.selectbox("قالب فایل", formats, key="export_format")
+        scope = None if category == "همه" else category
+        st.caption(f"دسته‌بندی: {category if scope else 'همه'}")
+        if not st.button("ساخت فایل خروجی", key="export_build"):
+            return
+        
+        with tempfile.TemporaryFile() as spool:
+            with METRICS.timed("export", format=export_format):
+                if export_format == "parquet":
+                    count = export_news(get_database(), spool, export_format, scope)
+                else:
+                    text = io.TextIOWrapper(spool, encoding="utf-8", newline="")
+                    count = export_news(get_database(), text, export_format, scope)
+                    text.flush()
+                    text.detach()
+            spool.flush()
+            spool.seek(0)
+            # download_button takes raw or read-only buffered files, not BufferedRandom
+            st.download_button(
+                f"دانلود {count} خبر",
+                spool.raw,
+                file_name=f"news.{export_format}",
+                mime=EXPORT_MIME_TYPES[export_format],
+                key="export_download",
+                on_click="ignore",
+            )
+
+# Show when the news were last refreshed and whether a scrape is running right now
+def display_scrape_status():
+    status = get_scrape_status(get_database())
+    if status["in_progress"]:
+        st.info("در حال به روز رسانی اخبار... ⏳")
+    if status["finished_at"]:
+        caption = f"آخرین به روز رسانی: {status['finished_at']} (UTC)"
+        if status["fetch_seconds"] is not None and status["parse_seconds"] is not None:
+            caption += f" • دریافت {status['fetch_seconds']:.2f}s • پردازش {status['parse_seconds']:.2f}s"
+        st.caption(caption)
 
 def display_news(category=None, page=1, per_page=5):
-    # Initialize database first
-    init_database()
-    
-    conn = sqlite3.connect('data.db', check_same_thread=False)
-    cursor = conn.cursor()
-    
-    offset = (page - 1) * per_page
-    
-    # Get news data based on category
-    if category and category != "همه":
-        cursor.execute("""
-            SELECT title, body, source_url, category 
-            FROM news 
-            WHERE category=? 
-            ORDER BY timestamp DESC 
-            LIMIT ? OFFSET ?
-        """, (category, per_page, offset))
-    else:
-        cursor.execute("""
-            SELECT title, body, source_url, category 
-            FROM news 
-            ORDER BY timestamp DESC 
-            LIMIT ? OFFSET ?
-        """, (per_page, offset))
+    # Keyset cursors: page number -> (timestamp, id) of the last row on the previous page.
+    # Seeking from a cursor costs the same on every page; OFFSET is only the
+    # fallback when a page is reached without one (e.g. right after a filter change).
+    cursors = st.session_state.setdefault("news_cursors", {})
+    after = cursors.get(page) if page > 1 else None
+    
+    offset = 0 if after or page <= 1 else (page - 1) * per_page
     
-    data = cursor.fetchall()
-    conn.close()
+    if not category or category == "همه":
+        category = None
+    data = cached_query("news_page", query_news_page, category, after, offset, per_page)
+    
+    # Remember where the next page starts
+    if data:
+        cursors[page + 1] = (data[-1][4], data[-1][5])
     
     st.markdown('<div class="section-header">اخبار دیجیاتو 📰</div>', unsafe_allow_html=True)
     
     if not data:
-        st.warning("اخباری برای نمایش وجود ندارد. لطفاً دکمه 'دریافت اخبار' را کلیک کنید. 🔄")
+        if BACKGROUND_SCRAPER:
+            st.warning("اخباری برای نمایش وجود ندارد. اخبار به زودی توسط سرویس دریافت خودکار اضافه می‌شوند. 🔄")
+        else:
+            st.warning("اخباری برای نمایش وجود ندارد. لطفاً دکمه 'دریافت اخبار' را کلیک کنید. 🔄")
         return
     
-    for row in data:
-        # Extract data
-        if len(row) >= 4:
-            title, body, source_url, category = row
-        else:
-            # Handle case where data might be incomplete
-            title = row[0]
-            body = row[1] if len(row) > 1 else ""
-            source_url = row[2] if len(row) > 2 else "#"
-            category = row[3] if len(row) > 3 else "تکنولوژی"
-        
-        # Display news item with custom styling
-        st.markdown(f"""
-        <div class="news-container">
-            <div class="news-title">{title}</div>
-            <span class="category-tag">{category}</span>
-            <div class="news-body">{body}</div>
-            <a href="{source_url}" target="_blank" class="news-link-btn">مشاهده مطلب کامل 🔗</a>
-        </div>
-        """, unsafe_allow_html=True)
+    # The whole page is sent to the browser as a single element
+    with METRICS.timed("render", list="news"):
+        cards = render_news_cards(data, get_thumbnail_cache())
+        st.markdown(cards, unsafe_allow_html=True)
+    METRICS.add_bytes("render", len(cards), list="news")
+    
+    display_full_text_picker(data, "news_full_text")
     
     return len(data)
 
-def display_search_results(search_results, search_term, page=1, per_page=5):
-    st.markdown(f'<div class="section-header">نتایج جستجو برای "{search_term}" 🔍</div>', unsafe_allow_html=True)
+def display_search_results(search_results, search_term):
+    st.markdown(f'<div class="section-header">نتایج جستجو برای "{html.escape(search_term)}" 🔍</div>', unsafe_allow_html=True)
     
     if not search_results:
         st.warning("هیچ نتیجه‌ای یافت نشد. 😞")
         return 0
     
-    offset = (page - 1) * per_page
-    paginated_results = search_results[offset:offset + per_page]
+    with METRICS.timed("render", list="search"):
+        cards = render_news_cards(search_results, get_thumbnail_cache())
+        st.markdown(cards, unsafe_allow_html=True)
+    METRICS.add_bytes("render", len(cards), list="search")
     
-    for row in paginated_results:
-        # Extract data
-        if len(row) >= 4:
-            title, body, source_url, category = row
-        else:
-            # Handle case where data might be incomplete
-            title = row[0]
-            body = row[1] if len(row) > 1 else ""
-            source_url = row[2] if len(row) > 2 else "#"
-            category = row[3] if len(row) > 3 else "تکنولوژی"
-        
-        # Display news item with custom styling
-        st.markdown(f"""
-        <div class="news-container">
-            <div class="news-title">{title}</div>
-            <span class="category-tag">{category}</span>
-            <div class="news-body">{body}</div>
-            <a href="{source_url}" target="_blank" class="news-link-btn">مشاهده مطلب کامل 🔗</a>
-        </div>
-        """, unsafe_allow_html=True)
-    
-    return len(paginated_results)
+    display_full_text_picker(search_results, "search_full_text")
+    
+    return len(search_results)
 
 def render_pagination(total_items, current_page, per_page, key_prefix=""):
     total_pages = (total_items + per_page - 1) // per_page
@@ -692,113 +740,126 @@ def display_contact_section():
     st.markdown('</div>', unsafe_allow_html=True)
 
 def main():
-    # Initialize database at startup
-    init_database()
+    # Open the shared database (schema setup runs once per process)
+    get_database()
     
     load_css()
     
     st.markdown('<div class="title-animation"><h1>اخبار دیجیاتو 📰</h1></div>', unsafe_allow_html=True)
     
+    display_scrape_status()
+    
     # Initialize session state for pagination
     if 'news_page' not in st.session_state:
         st.session_state.news_page = 1
     if 'search_page' not in st.session_state:
         st.session_state.search_page = 1
+    if 'news_cursors' not in st.session_state:
+        st.session_state.news_cursors = {}
     
     # Items per page
     per_page = 5
     
     # Add search box
     search_term = st.text_input("جستجو در اخبار 🔍", key="search_input")
+    if search_term:
+        display_search_suggestions(search_term)
     
-    # Get available categories from database
-    conn = sqlite3.connect('data.db', check_same_thread=False)
-    cursor = conn.cursor()
-    cursor.execute("SELECT DISTINCT category FROM news")
-    categories = [cat[0] for cat in cursor.fetchall() if cat[0]]
-    conn.close()
+    # Get available categories and their article counts from database
+    category_counts = get_category_counts()
+    categories = list(category_counts)
     
     # If no categories exist yet, use default list
     if not categories:
         categories = ["تکنولوژی", "خودرو", "علمی", "کسب و کار"]
+    total_count = get_news_count()
     
-    # Category filter select box
+    # Category filter select box, with the number of articles next to each option
     category_filter = st.selectbox(
         "فیلتر بر اساس دسته‌بندی 🏷️",
         options=["همه"] + categories,
-        format_func=lambda x: "همه دسته‌بندی‌ها" if x == "همه" else x,
+        format_func=lambda x: f"همه دسته‌بندی‌ها ({total_count})" if x == "همه" else f"{x} ({category_counts.get(x, 0)})",
         key="category_filter"
     )
     
-    # Button to fetch news from Digiato
-    if st.button("دریافت اخبار 🔄", key="fetch_news"):
+    # Page cursors only hold for the category they were collected in
+    if st.session_state.get('news_cursor_category') != category_filter:
+        st.session_state.news_cursors = {}
+        st.session_state.news_cursor_category = category_filter
+    
+    # Button to fetch news from Digiato (the background service does this when enabled)
+    if not BACKGROUND_SCRAPER and st.button("دریافت اخبار 🔄", key="fetch_news"):
         scrape_and_store_news()
+        st.session_state.news_cursors = {}
         st.rerun()
     
     # Check if we need to search
     if search_term:
-        # Display search results
-        conn = sqlite3.connect('data.db', check_same_thread=False)
-        cursor = conn.cursor()
-        
-        if category_filter != "همه":
-            cursor.execute(
-                "SELECT title, body, source_url, category FROM news WHERE (title LIKE ? OR body LIKE ?) AND category=? ORDER BY timestamp DESC", 
-                (f"%{search_term}%", f"%{search_term}%", category_filter)
-            )
-        else:
-            cursor.execute(
-                "SELECT title, body, source_url, category FROM news WHERE title LIKE ? OR body LIKE ? ORDER BY timestamp DESC", 
-                (f"%{search_term}%", f"%{search_term}%")
+        # Display search results; only the current page is read from the database
+        with METRICS.timed("search", category=category_filter):
+            search_results, total_results = search_news(
+                search_term,
+                category_filter,
+                st.session_state.search_page,
+                per_page
             )
+        METRICS.add_rows("search", len(search_results), category=category_filter)
         
-        search_results = cursor.fetchall()
-        conn.close()
-        
-        displayed_items = display_search_results(
-            search_results, 
-            search_term, 
-            st.session_state.search_page, 
-            per_page
-        )
+        displayed_items = display_search_results(search_results, search_term)
         
         # Pagination for search results
-        if len(search_results) > per_page:
-            new_page = render_pagination(
-                len(search_results),
-                st.session_state.search_page,
-                per_page,
-                "search"
-            )
+        if total_results > per_page:
+            with METRICS.timed("render_pagination"):
+                new_page = render_pagination(
+                    total_results,
+                    st.session_state.search_page,
+                    per_page,
+                    "search"
+                )
             if new_page != st.session_state.search_page:
                 st.session_state.search_page = new_page
                 st.rerun()
     else:
         # Display regular news based on category filter
-        total_news = get_news_count(category_filter)
-        displayed_items = display_news(
-            category_filter, 
-            st.session_state.news_page, 
-            per_page
-        )
+        with METRICS.timed("news_count", category=category_filter):
+            total_news = get_news_count(category_filter)
+        with METRICS.timed("display_news", category=category_filter):
+            displayed_items = display_news(
+                category_filter, 
+                st.session_state.news_page, 
+                per_page
+            )
+        METRICS.add_rows("display_news", displayed_items or 0, category=category_filter)
         
         # Pagination for news
         if total_news > per_page:
-            new_page = render_pagination(
-                total_news,
-                st.session_state.news_page,
-                per_page,
-                "news"
-            )
+            with METRICS.timed("render_pagination"):
+                new_page = render_pagination(
+                    total_news,
+                    st.session_state.news_page,
+                    per_page,
+                    "news"
+                )
             if new_page != st.session_state.news_page:
                 st.session_state.news_page = new_page
                 st.rerun()
     
     # Add a refresh button
-    if st.button("به روز رسانی اخبار ✨", key="refresh_btn"):
+    if not BACKGROUND_SCRAPER and st.button("به روز رسانی اخبار ✨", key="refresh_btn"):
         scrape_and_store_news()
+        st.session_state.news_cursors = {}
         st.rerun()
     
+    # Query cache counters, for sizing QUERY_CACHE_SIZE against real traffic
+    with st.sidebar.expander("آمار کش کوئری 📊"):
+        st.json(get_query_cache().stats())
+        st.json(get_prefix_index().stats())
+    
+    display_export_panel(category_filter)
+    
+    if ADMIN_PANEL:
+        display_admin_panel()
+    
     # Display contact section
     display_contact_section()
     
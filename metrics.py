@@ -0,0 +1,187 @@
+import json
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from atomic_file import write_atomic
+
+# Latency histogram bucket upper bounds in seconds
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Prefix of every exported metric name
+METRIC_PREFIX = "digiato"
+
+# Label value escaping required by the Prometheus text format
+def escape_label_value(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+# Render labels as {key="value",...}; extra pairs (such as le) are appended
+def format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{escape_label_value(value)}"' for key, value in pairs) + "}"
+
+# Cumulative latency histogram of one labelled series
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+    
+    def observe(self, seconds):
+        self.counts[bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+    
+    # Estimate a quantile by interpolating inside the bucket that holds it
+    def quantile(self, q):
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            if seen + bucket_count >= rank and bucket_count:
+                lower = self.buckets[index - 1] if index > 0 else 0.0
+                upper = self.buckets[index] if index < len(self.buckets) else lower
+                return lower + (upper - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return self.buckets[-1]
+
+# Process-wide store of per-stage latency histograms and counters. Series are keyed by
+# metric name plus labels such as stage and category.
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+    
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted((key, str(value)) for key, value in labels.items() if value is not None))
+    
+    def observe(self, stage, seconds, **labels):
+        key = self._key("stage_seconds", dict(labels, stage=stage))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(seconds)
+    
+    def increment(self, name, amount=1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+    
+    def add_rows(self, stage, rows, **labels):
+        self.increment("rows_total", rows, stage=stage, **labels)
+    
+    def add_bytes(self, stage, size, **labels):
+        self.increment("bytes_total", size, stage=stage, **labels)
+    
+    def record_error(self, stage, **labels):
+        self.increment("errors_total", 1, stage=stage, **labels)
+    
+    # Time the body of a with-block as one observation of `stage`; errors are counted
+    # for the same stage and re-raised
+    @contextmanager
+    def timed(self, stage, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.record_error(stage, **labels)
+            raise
+        finally:
+            self.observe(stage, time.perf_counter() - started, **labels)
+    
+    # One summary dict per stage/category series, for display
+    def summary(self):
+        with self._lock:
+            histograms = list(self._histograms.items())
+            counters = dict(self._counters)
+        rows = []
+        for (name, labels), histogram in sorted(histograms):
+            labels = dict(labels)
+            counter_labels = tuple(sorted(labels.items()))
+            rows.append({
+                **labels,
+                "count": histogram.count,
+                "mean_ms": round(histogram.sum / histogram.count * 1000, 2) if histogram.count else None,
+                "p50_ms": round(histogram.quantile(0.5) * 1000, 2) if histogram.count else None,
+                "p95_ms": round(histogram.quantile(0.95) * 1000, 2) if histogram.count else None,
+                "rows": counters.get(("rows_total", counter_labels), 0),
+                "bytes": counters.get(("bytes_total", counter_labels), 0),
+                "errors": counters.get(("errors_total", counter_labels), 0),
+            })
+        return rows
+    
+    # Current value of every counter as {"name": ..., <labels>, "value": ...} rows
+    def counters(self):
+        with self._lock:
+            counters = dict(self._counters)
+        return [{"name": name, **dict(labels), "value": value} for (name, labels), value in sorted(counters.items())]
+    
+    # Prometheus text exposition format
+    def to_prometheus(self):
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+            counters = sorted(self._counters.items())
+        
+        lines = []
+        name = f"{METRIC_PREFIX}_stage_seconds"
+        if histograms:
+            lines.append(f"# TYPE {name} histogram")
+        for (_, labels), histogram in histograms:
+            cumulative = 0
+            for bound, bucket_count in zip(histogram.buckets, histogram.counts):
+                cumulative += bucket_count
+                lines.append(f"{name}_bucket{format_labels(labels, [('le', bound)])} {cumulative}")
+            lines.append(f"{name}_bucket{format_labels(labels, [('le', '+Inf')])} {histogram.count}")
+            lines.append(f"{name}_sum{format_labels(labels)} {histogram.sum}")
+            lines.append(f"{name}_count{format_labels(labels)} {histogram.count}")
+        
+        typed = set()
+        for (counter, labels), value in counters:
+            name = f"{METRIC_PREFIX}_{counter}"
+            if name not in typed:
+                lines.append(f"# TYPE {name} counter")
+                typed.add(name)
+            lines.append(f"{name}{format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+    
+    # One JSON object per series, stamped with the export time
+    def to_json_lines(self):
+        now = time.time()
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+            counters = sorted(self._counters.items())
+        lines = []
+        for (name, labels), histogram in histograms:
+            lines.append(json.dumps({
+                "time": now,
+                "metric": f"{METRIC_PREFIX}_{name}",
+                "labels": dict(labels),
+                "count": histogram.count,
+                "sum": histogram.sum,
+                "buckets": dict(zip([str(bound) for bound in histogram.buckets] + ["+Inf"], histogram.counts)),
+            }, ensure_ascii=False))
+        for (name, labels), value in counters:
+            lines.append(json.dumps({
+                "time": now,
+                "metric": f"{METRIC_PREFIX}_{name}",
+                "labels": dict(labels),
+                "value": value,
+            }, ensure_ascii=False))
+        return "\n".join(lines) + ("\n" if lines else "")
+
+# Metrics of this process (the Streamlit app or the scraper service)
+METRICS = MetricsRegistry()
+
+# Write the current metrics to a file, as JSON lines for *.jsonl and Prometheus text
+# otherwise; written to a temporary file first so collectors never read half a file
+def export_metrics(path):
+    content = METRICS.to_json_lines() if path.endswith(".jsonl") else METRICS.to_prometheus()
+    write_atomic(path, content)
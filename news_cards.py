@@ -0,0 +1,66 @@
+import functools
+import html
+from string import Template
+
+# Number of rendered article cards kept in memory
+RENDER_CACHE_SIZE = 2048
+
+# Article card markup, compiled once. Kept on a single line so many cards can be
+# concatenated into one markdown block without markdown reinterpreting them.
+NEWS_CARD_TEMPLATE = Template(
+    '<div class="news-container">'
+    '$thumbnail'
+    '<div class="news-title">$title</div>'
+    '<span class="category-tag">$category</span>'
+    '<div class="news-body">$body</div>'
+    '<a href="$source_url" target="_blank" class="news-link-btn">مشاهده مطلب کامل 🔗</a>'
+    '</div>\n'
+)
+
+# Lead image of a card, inlined as a data: URI so the page needs no extra requests
+NEWS_THUMBNAIL_TEMPLATE = Template('<img class="news-thumb" src="$src" alt="">')
+
+# Render one article card. Fields are HTML-escaped and whitespace is collapsed, so
+# text from the page can neither inject markup nor break the surrounding markdown.
+# Cached per row: the row holds the article id, its content and its thumbnail key, so
+# an edited article gets a fresh fragment. The cache lives in this module rather than
+# in main.py, which Streamlit executes afresh on every rerun.
+@functools.lru_cache(maxsize=RENDER_CACHE_SIZE)
+def render_news_card(row, thumbnail_cache=None):
+    # Extract data
+    if len(row) >= 4:
+        title, body, source_url, category = row[:4]
+    else:
+        # Handle case where data might be incomplete
+        title = row[0]
+        body = row[1] if len(row) > 1 else ""
+        source_url = row[2] if len(row) > 2 else "#"
+        category = row[3] if len(row) > 3 else "تکنولوژی"
+    
+    # Thumbnail key, when one was fetched; an evicted thumbnail leaves the card text-only
+    thumbnail = ""
+    src = thumbnail_cache.data_uri(row[6]) if thumbnail_cache is not None and len(row) > 6 and row[6] else None
+    if src:
+        thumbnail = NEWS_THUMBNAIL_TEMPLATE.substitute(src=src)
+    
+    return NEWS_CARD_TEMPLATE.substitute(
+        thumbnail=thumbnail,
+        title=html.escape(" ".join((title or "").split())),
+        category=html.escape(category or ""),
+        body=html.escape(" ".join((body or "").split())),
+        source_url=html.escape(source_url or "#", quote=True),
+    )
+
+# A whole page of article cards as one HTML string. Every shown thumbnail is touched,
+# so eviction follows what is actually viewed even when the card itself comes from
+# the render cache. Only the cache files are touched, never the database: the thumbnail
+# stage of the scraper downloads evicted thumbnails again.
+def render_news_cards(rows, thumbnail_cache=None):
+    cards = []
+    for row in rows:
+        if thumbnail_cache is not None and len(row) > 6 and row[6] and not thumbnail_cache.touch(row[6]):
+            # Rendered (and cached) without the key, so the card shows the thumbnail
+            # again once it is back
+            row = row[:6] + (None,) + row[7:]
+        cards.append(render_news_card(row, thumbnail_cache))
+    return "".join(cards)
@@ -0,0 +1,158 @@
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+import requests
+
+from metrics import METRICS
+from sources import host_of
+
+# Retries after the first attempt, full-jitter exponential backoff base and cap in
+# seconds, and the answers worth retrying. A Retry-After longer than RETRY_MAX_DELAY is
+# not waited for; the response is returned as it is.
+RETRY_ATTEMPTS = 2
+RETRY_BACKOFF = 0.5
+RETRY_MAX_DELAY = 8.0
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+RETRY_METHODS = {"GET", "HEAD"}
+
+# Client errors that are not worth asking again for: the page is gone or refused. 408,
+# 425 and 429 are excluded, since they only mean "not now".
+TRANSIENT_CLIENT_STATUSES = {408, 425, 429}
+
+# Circuit breaker: consecutive failures that open it, and seconds it stays open before
+# one trial request is let through
+BREAKER_FAILURES = 5
+BREAKER_RESET = 60.0
+
+# Raised instead of sending a request while the host's circuit is open
+class CircuitOpenError(requests.ConnectionError):
+    pass
+
+# Per-host circuit breaker. Closed: requests pass and consecutive failures are counted.
+# Open: requests fail at once until `reset` seconds have passed. Half-open: a single
+# trial request is let through; success closes the circuit, failure opens it again.
+class CircuitBreaker:
+    def __init__(self, failures=BREAKER_FAILURES, reset=BREAKER_RESET):
+        self.failures = failures
+        self.reset = reset
+        self.state = "closed"
+        self._failed = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+    
+    def allow(self):
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self._opened_at >= self.reset:
+                self.state = "half_open"
+                return True
+            # Open, or half-open with the trial request still running
+            return False
+    
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self._failed = 0
+    
+    # Returns True when this failure opened the circuit
+    def record_failure(self):
+        with self._lock:
+            self._failed += 1
+            if self.state == "half_open" or (self.state == "closed" and self._failed >= self.failures):
+                self.state = "open"
+                self._opened_at = time.monotonic()
+                return True
+            return False
+
+# True for an HTTPError with a 4xx answer that will not change on a later run (404,
+# 410, 403, ...). Server errors, timeouts and open circuits are worth another try.
+def is_permanent_failure(error):
+    response = getattr(error, "response", None)
+    if not isinstance(error, requests.HTTPError) or response is None:
+        return False
+    return 400 <= response.status_code < 500 and response.status_code not in TRANSIENT_CLIENT_STATUSES
+
+# Seconds to wait before retry number `attempt` (0-based): uniform in [0, base * 2^attempt]
+def backoff_delay(attempt, base=RETRY_BACKOFF, cap=RETRY_MAX_DELAY):
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+# Delay asked for by a Retry-After header (seconds or HTTP date), or None
+def retry_after_seconds(response):
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+# requests.Session with bounded retries of GET/HEAD on connection errors, timeouts and
+# 5xx/429 answers, and a circuit breaker per host. Every request made through it, including
+# those of the HTTP cache, goes through the same policy.
+class ResilientSession(requests.Session):
+    def __init__(self, retries=RETRY_ATTEMPTS, backoff=RETRY_BACKOFF, max_delay=RETRY_MAX_DELAY,
+                 breaker_failures=BREAKER_FAILURES, breaker_reset=BREAKER_RESET):
+        super().__init__()
+        self.retries = retries
+        self.backoff = backoff
+        self.max_delay = max_delay
+        self.breaker_failures = breaker_failures
+        self.breaker_reset = breaker_reset
+        self._breakers = {}
+        self._breakers_lock = threading.Lock()
+    
+    def breaker(self, url):
+        host = host_of(url)
+        with self._breakers_lock:
+            if host not in self._breakers:
+                self._breakers[host] = CircuitBreaker(self.breaker_failures, self.breaker_reset)
+            return self._breakers[host]
+    
+    def _failed(self, breaker, host):
+        if breaker.record_failure():
+            METRICS.increment("circuit_opened_total", host=host)
+    
+    def request(self, method, url, *args, **kwargs):
+        host = host_of(url)
+        breaker = self.breaker(url)
+        retries = self.retries if method.upper() in RETRY_METHODS else 0
+        
+        for attempt in range(retries + 1):
+            if not breaker.allow():
+                METRICS.increment("circuit_rejected_total", host=host)
+                raise CircuitOpenError(f"{host} is failing, requests paused for up to {self.breaker_reset:.0f}s")
+            
+            try:
+                response = super().request(method, url, *args, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                self._failed(breaker, host)
+                if attempt == retries:
+                    raise
+                reason = type(e).__name__
+                delay = backoff_delay(attempt, self.backoff, self.max_delay)
+            except Exception:
+                # Not worth retrying (broken chunked body, redirect loop, ...), but still a
+                # failure: a half-open circuit must not wait for a trial result forever
+                self._failed(breaker, host)
+                raise
+            else:
+                if response.status_code not in RETRY_STATUSES:
+                    breaker.record_success()
+                    return response
+                self._failed(breaker, host)
+                requested = retry_after_seconds(response)
+                if attempt == retries or (requested is not None and requested > self.max_delay):
+                    return response
+                reason = str(response.status_code)
+                delay = requested if requested is not None else backoff_delay(attempt, self.backoff, self.max_delay)
+                response.close()
+            
+            METRICS.increment("http_retries_total", host=host, reason=reason)
+            time.sleep(delay)
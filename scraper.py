@@ -0,0 +1,778 @@
+from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from urllib.parse import parse_qsl, urlencode, urljoin, urlsplit, urlunsplit
+import argparse
+import functools
+import itertools
+import hashlib
+import logging
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+import time
+from contextlib import contextmanager
+
+from database import (
+    CATEGORY_RETENTION_DAYS,
+    DATABASE_PATH,
+    RETENTION_DAYS,
+    DatabaseManager,
+    articles_missing_content,
+    articles_missing_thumbnail,
+    discard_staged_articles,
+    fingerprint_article,
+    get_scrape_status,
+    known_source_urls,
+    maintain_database,
+    mark_scrape_finished,
+    mark_scrape_started,
+    merge_staged_articles,
+    requeue_thumbnails,
+    stage_articles,
+    stored_listing_hash,
+    store_article_content,
+    store_thumbnails,
+    stored_thumbnails,
+)
+from http_cache import HTTP_CACHE_DIR, HttpCache
+from metrics import METRICS, export_metrics
+from resilience import ResilientSession, is_permanent_failure
+from sources import SOURCES_FILE, article_strainer, compile_cascade, host_of, load_registry
+from thumbnail_cache import IMAGE_MAX_BYTES, THUMBNAIL_CACHE_DIR, THUMBNAIL_CACHE_MAX_BYTES, ThumbnailCache, make_thumbnail
+
+# Request timeouts in seconds: connecting fails fast, a slow page gets longer. Worker
+# threads and per-host budgets come from the source registry (sources.json); retries
+# and circuit breakers from resilience.py.
+FETCH_CONNECT_TIMEOUT = 3.05
+FETCH_READ_TIMEOUT = 10
+FETCH_TIMEOUT = (FETCH_CONNECT_TIMEOUT, FETCH_READ_TIMEOUT)
+
+# Cross-process scrape lock; POSIX only, other platforms lock within the process
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# lxml is several times faster than the pure-Python parser; fall back when it is missing
+try:
+    import lxml  # noqa: F401
+    PARSER_BACKEND = "lxml"
+except ImportError:
+    PARSER_BACKEND = "html.parser"
+
+# Parse stage: listing pages are parsed, and their articles fingerprinted, in this many
+# worker processes, so the CPU-bound work scales with cores instead of contending for
+# the GIL with the fetch threads. Runs covering fewer than PARSE_POOL_MIN_PAGES pages
+# parse in the fetch threads, where starting processes would cost more than it saves.
+# With one core, or DIGIATO_PARSE_PROCESSES=1 (--parse-processes 1), processes are
+# never used.
+PARSE_PROCESSES = int(os.environ.get("DIGIATO_PARSE_PROCESSES", min(os.cpu_count() or 1, 8)))
+PARSE_POOL_MIN_PAGES = 16
+
+# Parsed pages waiting for the writer. A full queue makes the fetch threads wait, so
+# memory stays bounded however many pages a run covers. The writer stages pages in
+# transactions of about STAGE_BATCH_ROWS articles.
+PIPELINE_QUEUE_PAGES = 32
+STAGE_BATCH_ROWS = 500
+
+# Listing pages read per category. Routine refreshes read only the first page; a cold
+# start can backfill with a larger depth (python -m scraper --depth 200).
+CRAWL_DEPTH = 1
+
+# Thumbnail stage: lead images downloaded per run; they share the full-text workers.
+# The thumbnails of the newest THUMBNAIL_RECHECK articles are downloaded again when
+# they were evicted. Older ones are not: re-fetching everything evicted would only
+# evict something else.
+THUMBNAIL_BATCH = 40
+THUMBNAIL_RECHECK = 200
+
+# Full-article stage: articles fetched per run and parallel downloads
+FULL_TEXT_BATCH = 40
+FULL_TEXT_WORKERS = 4
+
+# Seconds between two runs of the background scraper service
+SCRAPE_INTERVAL = 15 * 60
+
+REQUEST_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+}
+
+# Listing sources, selectors and host budgets; see sources.py
+REGISTRY = load_registry()
+CATEGORIES = REGISTRY.sources
+
+# Query parameters dropped from article URLs (utm_* are dropped as well)
+TRACKING_PARAMS = {"fbclid", "gclid", "yclid", "mc_cid", "mc_eid", "ref", "ref_src", "igshid", "_ga"}
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+# (source url, cascade name) -> index of the selector that matched last time
+matched_selectors = {}
+
+# Parse process pools by size, started on first use and kept for later runs
+parse_pools = {}
+parse_pools_guard = threading.Lock()
+
+# Per-database (and per-stage) scrape locks used when fcntl is not available
+process_locks = {}
+process_locks_guard = threading.Lock()
+
+logger = logging.getLogger("scraper")
+
+# HTTP session with a connection pool, so TCP/TLS connections are reused across
+# categories, and with retries and per-host circuit breakers
+def create_http_session(registry=None):
+    registry = registry or REGISTRY
+    pool_size = max(registry.max_workers, registry.max_concurrency())
+    session = ResilientSession()
+    adapter = HTTPAdapter(pool_connections=max(10, len(registry.host_settings)), pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update(REQUEST_HEADERS)
+    return session
+
+# Canonicalize an article URL so the same story always maps to the same key: lower-case
+# host without "www." or default port, no trailing slash, no fragment, and no tracking
+# parameters; the remaining query parameters are sorted
+def normalize_source_url(url):
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = parts.hostname or ""
+    if host.startswith("www."):
+        host = host[4:]
+    if parts.port and DEFAULT_PORTS.get(scheme) != parts.port:
+        host = f"{host}:{parts.port}"
+    path = parts.path.rstrip('/') or '/'
+    query = sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if key.lower() not in TRACKING_PARAMS and not key.lower().startswith("utm_")
+    )
+    return urlunsplit((scheme, host, path, urlencode(query), ''))
+
+# Run a compiled selector cascade, trying first the selector that matched last time
+# for this source. Returns a list when find_all is set, otherwise one element or None.
+# The last selector of a cascade is a catch-all and is never remembered, so it cannot
+# shadow the more specific ones for later articles.
+def match_cascade(node, cascade, memory_key, find_all=False):
+    remembered = matched_selectors.get(memory_key)
+    order = range(len(cascade))
+    if remembered is not None:
+        order = [remembered] + [index for index in order if index != remembered]
+    
+    for index in order:
+        result = cascade[index].select(node) if find_all else cascade[index].select_one(node)
+        if result:
+            if index < len(cascade) - 1:
+                matched_selectors[memory_key] = index
+            return result
+    return [] if find_all else None
+
+# Absolute URL of an image element's picture: the lazy-loading attributes first, then
+# src, then the first srcset candidate. None for inline data: images.
+def image_source(image_elem, base_url):
+    if image_elem is None:
+        return None
+    for attribute in ("data-src", "data-lazy-src", "src", "srcset"):
+        value = (image_elem.get(attribute) or "").strip()
+        if attribute == "srcset":
+            value = value.split(",")[0].strip().split(" ")[0]
+        if value and not value.startswith("data:"):
+            return urljoin(base_url, value)
+    return None
+
+# Extract (title, body, source_url, category, image_url) rows from a category listing
+# page, using the source's own selectors when the registry defines them
+def extract_articles(html, category):
+    parsed = []
+    source = category["url"]
+    cascades = category.get("cascades") or REGISTRY.default_cascades
+    strainer = category["strainer"] if "strainer" in category else REGISTRY.default_strainer
+    soup = BeautifulSoup(html, PARSER_BACKEND, parse_only=strainer)
+    
+    # Try different selectors for finding news items
+    articles = match_cascade(soup, cascades["article"], (source, "article"), find_all=True)
+    
+    for article in articles:
+        # Extract title
+        title_elem = match_cascade(article, cascades["title"], (source, "title"))
+        
+        # Extract body
+        body_elem = match_cascade(article, cascades["body"], (source, "body"))
+        
+        # Lead image, optional
+        image_elem = match_cascade(article, cascades["image"], (source, "image")) if "image" in cascades else None
+        
+        if title_elem and body_elem:
+            title = title_elem.text.strip()
+            body = body_elem.text.strip()
+            
+            # Get URL
+            if title_elem.has_attr("href"):
+                source_url = title_elem["href"]
+            else:
+                source_url = title_elem.parent.get("href") if title_elem.parent.name == "a" else None
+            
+            # Make URL absolute if needed
+            if source_url:
+                source_url = normalize_source_url(urljoin(category["url"], source_url))
+            else:
+                # No article link: fall back to the category page, keyed by title
+                title_key = hashlib.sha1(title.encode("utf-8")).hexdigest()[:12]
+                source_url = f"{normalize_source_url(category['url'])}#{title_key}"
+            
+            parsed.append((title, body, source_url, category["name"], image_source(image_elem, category["url"])))
+    
+    return parsed
+
+# Source rebuilt from its selector strings in a parse process, compiled once per process
+@functools.lru_cache(maxsize=256)
+def compiled_source(url, name, selectors):
+    selectors = dict(selectors)
+    return {
+        "url": url,
+        "name": name,
+        "cascades": {kind: compile_cascade(list(cascade), kind) for kind, cascade in selectors.items()},
+        "strainer": article_strainer(list(selectors["article"])),
+    }
+
+# Articles of a listing page as staged rows: (title, body, source_url, category,
+# image_url, content_hash, simhash)
+def parse_articles(html, category):
+    return [article + fingerprint_article(article[0], article[1]) for article in extract_articles(html, category)]
+
+# Process pool entry point: the source arrives as picklable selector strings.
+# Returns (rows, seconds spent parsing).
+def parse_listing(html, url, name, selectors):
+    started = time.perf_counter()
+    rows = parse_articles(html, compiled_source(url, name, selectors))
+    return rows, time.perf_counter() - started
+
+# Shared pool of parse processes. Workers are started fresh (forkserver or spawn)
+# rather than forked, since forking a process that runs threads can copy held locks.
+def get_parse_pool(processes=PARSE_PROCESSES):
+    with parse_pools_guard:
+        pool = parse_pools.get(processes)
+        if pool is None:
+            method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            pool = parse_pools[processes] = ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context(method))
+        return pool
+
+# Drop a pool whose worker died, so the next run starts a new one
+def discard_parse_pool(pool):
+    with parse_pools_guard:
+        for processes, known in list(parse_pools.items()):
+            if known is pool:
+                del parse_pools[processes]
+    pool.shutdown(wait=False)
+
+# Parse a listing page in the process pool when one is given, otherwise on the calling
+# thread. Returns (rows, seconds spent parsing).
+def parse_page(html, category, parse_pool=None):
+    if parse_pool is not None and "selectors" in category:
+        selectors = tuple((kind, tuple(cascade)) for kind, cascade in sorted(category["selectors"].items()))
+        try:
+            return parse_pool.submit(parse_listing, html, category["url"], category["name"], selectors).result()
+        except BrokenProcessPool:
+            logger.warning("Parse process pool failed, parsing %s in-process", category["url"])
+            discard_parse_pool(parse_pool)
+    started = time.perf_counter()
+    rows = parse_articles(html, category)
+    return rows, time.perf_counter() - started
+
+# Extract the main text of an article page as paragraphs separated by blank lines
+def extract_article_text(html, source, cascade=None):
+    soup = BeautifulSoup(html, PARSER_BACKEND)
+    container = match_cascade(soup, cascade or REGISTRY.default_cascades["content"], (source, "content"))
+    if not container:
+        return None
+    
+    paragraphs = [p.get_text(" ", strip=True) for p in container.find_all("p")]
+    text = "\n\n".join(p for p in paragraphs if p) or container.get_text(" ", strip=True)
+    return text or None
+
+# Second pipeline stage: download article pages of recently stored news in parallel and
+# store their compressed main text. Returns how many articles were processed.
+def fetch_article_bodies(db, session, limit=FULL_TEXT_BATCH, max_workers=FULL_TEXT_WORKERS, registry=None):
+    registry = registry or REGISTRY
+    pending = articles_missing_content(db, limit)
+    if not pending:
+        return 0
+    
+    def fetch(source_url):
+        host = host_of(source_url)
+        with host_slot(registry, source_url), METRICS.timed("full_text_fetch", host=host):
+            response = session.get(source_url, timeout=FETCH_TIMEOUT)
+            response.raise_for_status()
+        METRICS.add_bytes("full_text_fetch", len(response.content), host=host)
+        with METRICS.timed("full_text_parse", host=host):
+            return extract_article_text(response.text, host, registry.content_cascade(source_url))
+    
+    stored = 0
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(fetch, source_url): news_id for news_id, source_url in pending}
+        for future in as_completed(futures):
+            try:
+                text = future.result()
+            except Exception as e:
+                if not is_permanent_failure(e):
+                    # Left without a row, so the next run tries again
+                    logger.warning("Full text for article %d failed: %s", futures[future], e)
+                    continue
+                # Page gone for good: recorded without text, so it cannot hold up the batch
+                logger.info("Full text for article %d unavailable: %s", futures[future], e)
+                text = None
+            with METRICS.timed("full_text_write"), db.writer() as conn:
+                store_article_content(conn, futures[future], text)
+            stored += 1
+    METRICS.add_rows("full_text_write", stored)
+    return stored
+
+# Thumbnail stage: download the lead images of recently stored articles, shrink them and
+# keep them in the thumbnail cache, then evict the least recently used ones past the
+# cache size. Returns how many articles were processed.
+def fetch_thumbnails(db, session, thumbnail_cache, limit=THUMBNAIL_BATCH, max_workers=FULL_TEXT_WORKERS, registry=None):
+    registry = registry or REGISTRY
+    evicted = [news_id for news_id, key in stored_thumbnails(db, THUMBNAIL_RECHECK) if not thumbnail_cache.contains(key)]
+    if evicted:
+        requeue_thumbnails(db, evicted)
+    pending = articles_missing_thumbnail(db, limit)
+    if not pending:
+        return 0
+    
+    def fetch(image_url):
+        host = host_of(image_url)
+        with host_slot(registry, image_url), METRICS.timed("thumbnail_fetch", host=host):
+            with session.get(image_url, timeout=FETCH_TIMEOUT, stream=True) as response:
+                response.raise_for_status()
+                if not response.headers.get("Content-Type", "image/").startswith("image/"):
+                    return None
+                data = bytearray()
+                for chunk in response.iter_content(64 * 1024):
+                    data += chunk
+                    if len(data) > IMAGE_MAX_BYTES:
+                        return None
+        METRICS.add_bytes("thumbnail_fetch", len(data), host=host)
+        with METRICS.timed("thumbnail_resize"):
+            thumbnail = make_thumbnail(bytes(data))
+        # Not an image, or too large to keep: recorded without a thumbnail
+        return thumbnail_cache.put(*thumbnail) if thumbnail else None
+    
+    thumbnails = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(fetch, image_url): news_id for news_id, image_url in pending}
+        for future in as_completed(futures):
+            try:
+                thumbnails.append((futures[future], future.result()))
+            except Exception as e:
+                if not is_permanent_failure(e):
+                    # Left without a row, so the next run tries again
+                    logger.warning("Thumbnail for article %d failed: %s", futures[future], e)
+                    continue
+                # Image gone for good: recorded without a thumbnail, so it cannot hold up the batch
+                logger.info("Thumbnail for article %d unavailable: %s", futures[future], e)
+                thumbnails.append((futures[future], None))
+    if thumbnails:
+        with METRICS.timed("thumbnail_write"):
+            store_thumbnails(db, thumbnails)
+    METRICS.add_rows("thumbnail_write", len(thumbnails))
+    thumbnail_cache.evict()
+    return len(thumbnails)
+
+# URL of listing page N of a topic; page 1 is the topic URL itself
+def topic_page_url(url, page):
+    return url if page == 1 else f"{url.rstrip('/')}/page/{page}"
+
+# Hold the host's request budget (concurrency slot and rate token) for one request;
+# time spent waiting for it is recorded as the "throttle" stage
+@contextmanager
+def host_slot(registry, url):
+    budget = registry.budget(url)
+    with METRICS.timed("throttle", host=host_of(url)):
+        budget.acquire()
+    try:
+        yield
+    finally:
+        budget.release()
+
+# Fetch a listing page, through the on-disk HTTP cache when one is given
+def fetch_page(session, url, http_cache=None):
+    if http_cache is None:
+        return session.get(url, timeout=FETCH_TIMEOUT)
+    response = http_cache.get(session, url, FETCH_TIMEOUT)
+    METRICS.increment("http_cache_total", result=response.source)
+    return response
+
+# Crawl categories concurrently, following /page/N up to `depth` pages per category.
+# A category stops at the first page holding an article that is already stored, at an
+# empty page or at a non-200 answer (past the last page). Pages of one category are
+# fetched in order; the registry's max_workers categories run at once and every request
+# waits for its host's budget. With an http_cache, a category whose first page is
+# unchanged since the last fetch, and was stored in this database, is skipped entirely.
+# Pages are parsed in parse_pool when given, and wait in a bounded queue for the caller
+# to consume them. Yields (category, page, rows, body_sha256, fetch_seconds,
+# parse_seconds, error) per page, with rows as returned by parse_articles and the
+# page's body hash from the HTTP cache (None without one). When a category's crawl ends,
+# on_category_done(category, pages, unchanged) is called on the consuming thread with
+# the number of pages it yielded and whether it was skipped as unchanged.
+def crawl_categories(session, db, categories, depth=CRAWL_DEPTH, registry=None, http_cache=None, parse_pool=None, on_category_done=None):
+    registry = registry or REGISTRY
+    results = queue.Queue(maxsize=PIPELINE_QUEUE_PAGES)
+    done = object()
+    # Set when the consumer stops early, so no crawl thread stays blocked on the queue
+    cancelled = threading.Event()
+    
+    def put(item):
+        while not cancelled.is_set():
+            try:
+                results.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                pass
+    
+    def crawl(category):
+        name = category["name"]
+        pages = 0
+        unchanged = False
+        try:
+            for page in range(1, depth + 1):
+                if cancelled.is_set():
+                    break
+                try:
+                    url = topic_page_url(category["url"], page)
+                    with host_slot(registry, url):
+                        started = time.perf_counter()
+                        with METRICS.timed("fetch", category=name):
+                            response = fetch_page(session, url, http_cache)
+                        fetch_seconds = time.perf_counter() - started
+                    METRICS.add_bytes("fetch", len(response.content), category=name)
+                    if response.status_code != 200:
+                        # Past the last page is expected; a failing first page is not
+                        if page == 1:
+                            METRICS.record_error("fetch", category=name)
+                        break
+                    # Same page as last time and already stored: nothing to parse or write
+                    # for this category. A database that never stored it (new, deleted,
+                    # or the run crashed before the merge) gets the page parsed again.
+                    body_sha256 = getattr(response, "body_sha256", None)
+                    if getattr(response, "unchanged", False) and body_sha256 == stored_listing_hash(db, url):
+                        logger.info("%s page %d unchanged, skipped", category["url"], page)
+                        unchanged = True
+                        break
+                    
+                    # The thread waits for a parse process without holding the GIL
+                    try:
+                        articles, parse_seconds = parse_page(response.text, category, parse_pool)
+                    except Exception:
+                        METRICS.record_error("parse", category=name)
+                        raise
+                    METRICS.observe("parse", parse_seconds, category=name)
+                    METRICS.add_rows("parse", len(articles), category=name)
+                    
+                    # Early termination: everything past a known article was stored before.
+                    # Checked before the page is handed over for writing.
+                    last_page = not articles or page == depth
+                    if not last_page and known_source_urls(db, [article[2] for article in articles], name):
+                        last_page = True
+                except Exception as e:
+                    put((category, page, [], None, 0.0, 0.0, e))
+                    break
+                
+                put((category, page, articles, body_sha256, fetch_seconds, parse_seconds, None))
+                pages += 1
+                if last_page:
+                    break
+        finally:
+            put((done, category, pages, unchanged))
+    
+    # Interleave hosts in submission order, so the workers are spread over hosts instead
+    # of all queueing behind one host's budget
+    by_host = {}
+    for category in categories:
+        by_host.setdefault(host_of(category["url"]), []).append(category)
+    ordered = [category for group in itertools.zip_longest(*by_host.values()) for category in group if category]
+    
+    with ThreadPoolExecutor(max_workers=registry.max_workers) as executor:
+        for category in ordered:
+            executor.submit(crawl, category)
+        
+        try:
+            remaining = len(categories)
+            while remaining:
+                item = results.get()
+                if item[0] is done:
+                    remaining -= 1
+                    if on_category_done is not None:
+                        on_category_done(*item[1:])
+                else:
+                    yield item
+        finally:
+            cancelled.set()
+
+# Default progress reporter for headless runs
+def log_report(level, message):
+    getattr(logger, level)(message)
+
+# Single flight across sessions and processes: an exclusive flock on a file next to the
+# database, one per stage name. Yields True to the caller that got the lock and should
+# run, or False when a run was already in progress: after waiting for it to finish, or
+# at once with wait=False. Without fcntl (Windows) the lock only covers the current
+# process.
+@contextmanager
+def scrape_lock(db_path, name="scrape", wait=True):
+    if fcntl is None:
+        with process_locks_guard:
+            lock = process_locks.setdefault((db_path, name), threading.Lock())
+        if lock.acquire(blocking=False):
+            try:
+                yield True
+            finally:
+                lock.release()
+        else:
+            if wait:
+                with lock:
+                    pass
+            yield False
+        return
+    
+    with open(f"{db_path}.{name}.lock", "a") as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            # Join the run in progress: wait for it to release the lock, then use its result
+            if wait:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+            owner = False
+        else:
+            owner = True
+        try:
+            yield owner
+        finally:
+            if owner:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+# Scrape every category into the database and return how many articles were new or
+# changed. Progress goes to report(level, message) with level "info" or "error".
+# Listing pages go through http_cache when given, so unchanged categories cost one
+# conditional request. Returns once the listings are merged; full text and thumbnails
+# follow in run_enrichment. A call made while another session or process is scraping
+# the same database waits for that run and returns its result instead of starting
+# another.
+def run_scrape(db, session, categories=None, report=log_report, depth=CRAWL_DEPTH, http_cache=None, registry=None, parse_processes=PARSE_PROCESSES):
+    with scrape_lock(db.path) as owner:
+        if owner:
+            return scrape_categories(db, session, categories, report, depth, http_cache, registry, parse_processes)
+    
+    report("info", "به روز رسانی دیگری در جریان بود؛ نتیجه همان اجرا دریافت شد.")
+    return get_scrape_status(db)["articles_changed"] or 0
+
+# One scrape run; call through run_scrape so runs never overlap. A pipeline of three
+# stages: fetch threads, parse processes (see PARSE_PROCESSES) and this thread as the
+# single writer, which stages pages in batches while the crawl runs and merges them
+# into news in one transaction at the end.
+def scrape_categories(db, session, categories=None, report=log_report, depth=CRAWL_DEPTH, http_cache=None, registry=None, parse_processes=PARSE_PROCESSES):
+    registry = registry or REGISTRY
+    categories = categories or registry.sources
+    # Number of articles that were new or changed in this refresh
+    changed = 0
+    errors = []
+    # Listing pages staged in this run, to invalidate in the HTTP cache if the merge fails
+    staged_pages = []
+    # Summed over categories, to check that parsing stays well below fetch time
+    fetch_seconds = 0.0
+    parse_seconds = 0.0
+    # Parsed pages not staged yet: (category, page, rows, body_sha256)
+    batch = []
+    
+    # Categories with an error already reported
+    failed = set()
+    
+    def page_failed(category, page, error):
+        # A page that was cached but not stored must not count as unchanged next time
+        if http_cache is not None:
+            http_cache.invalidate(topic_page_url(category["url"], page))
+        errors.append(f"{category['name']}: {error}")
+        failed.add(category["name"])
+        report("error", f"خطا در دریافت اخبار {category['name']}: {str(error)}")
+    
+    # Progress, reported as each category finishes rather than all at the start
+    def category_done(category, pages, unchanged):
+        if category["name"] in failed:
+            return
+        if unchanged:
+            report("info", f"اخبار {category['name']} تغییری نکرده است.")
+        elif pages:
+            report("info", f"اخبار {category['name']} دریافت شد ({pages} صفحه).")
+        else:
+            report("info", f"خبری برای {category['name']} دریافت نشد.")
+    
+    # Stage the batched pages in one transaction, with the body hashes that mark them as
+    # stored once merged
+    def stage_batch():
+        rows = [row for category, page, parsed, body_sha256 in batch for row in parsed]
+        pages = [
+            (topic_page_url(category["url"], page), body_sha256)
+            for category, page, parsed, body_sha256 in batch if body_sha256
+        ]
+        try:
+            with METRICS.timed("stage"):
+                stage_articles(db, rows, pages)
+        except Exception as e:
+            for category, page, parsed, body_sha256 in batch:
+                page_failed(category, page, e)
+        else:
+            METRICS.add_rows("stage", len(rows))
+            staged_pages.extend(topic_page_url(category["url"], page) for category, page, parsed, body_sha256 in batch)
+        batch.clear()
+    
+    mark_scrape_started(db)
+    try:
+        discard_staged_articles(db)
+        report("info", f"دریافت اخبار {len(categories)} دسته...")
+        
+        parse_pool = None
+        if parse_processes > 1 and len(categories) * depth >= PARSE_POOL_MIN_PAGES:
+            parse_pool = get_parse_pool(parse_processes)
+        
+        # Pages are downloaded and parsed in parallel; staging stays on this thread
+        for category, page, parsed, body_sha256, page_fetch_seconds, page_parse_seconds, error in crawl_categories(session, db, categories, depth, registry, http_cache, parse_pool, category_done):
+            if error:
+                page_failed(category, page, error)
+                continue
+            
+            fetch_seconds += page_fetch_seconds
+            parse_seconds += page_parse_seconds
+            logger.info(
+                "%s page %d: fetched in %.3fs, parsed %d articles in %.3fs",
+                category["url"], page, page_fetch_seconds, len(parsed), page_parse_seconds,
+            )
+            
+            batch.append((category, page, parsed, body_sha256))
+            if sum(len(rows) for category, page, rows, body_sha256 in batch) >= STAGE_BATCH_ROWS:
+                stage_batch()
+        if batch:
+            stage_batch()
+        
+        # Everything the run found becomes visible at once
+        try:
+            with METRICS.timed("write"):
+                changed_by_category = merge_staged_articles(db)
+        except Exception as e:
+            if http_cache is not None:
+                for url in staged_pages:
+                    http_cache.invalidate(url)
+            errors.append(f"write: {e}")
+            report("error", f"خطا در ذخیره اخبار: {str(e)}")
+        else:
+            for name, count in changed_by_category.items():
+                METRICS.add_rows("write", count, category=name)
+            changed = sum(changed_by_category.values())
+    finally:
+        mark_scrape_finished(db, changed, "; ".join(errors) or None, fetch_seconds, parse_seconds)
+    
+    return changed
+
+# Follow-up stage of a scrape: full article text and lead-image thumbnails of the newest
+# articles. Kept out of run_scrape, whose callers wait on it, since these downloads are
+# paced by the host budgets and take far longer than the listings. Has its own lock and
+# never waits for it: a call while a run is going returns False at once, and that run
+# picks up the new articles as well.
+def run_enrichment(db, session, registry=None, thumbnail_cache=None):
+    with scrape_lock(db.path, "enrichment", wait=False) as owner:
+        if not owner:
+            return False
+        # Full article text; list pages never wait on it
+        try:
+            fetch_article_bodies(db, session, registry=registry)
+        except Exception:
+            logger.exception("Full text stage failed")
+        # Thumbnails of the lead images, served inline by the UI from the local cache
+        if thumbnail_cache is not None:
+            try:
+                fetch_thumbnails(db, session, thumbnail_cache, registry=registry)
+            except Exception:
+                logger.exception("Thumbnail stage failed")
+    return True
+
+# run_enrichment on a daemon thread, for callers (the UI) that must not wait for it
+def start_enrichment(db, session, registry=None, thumbnail_cache=None):
+    thread = threading.Thread(target=run_enrichment, args=(db, session, registry, thumbnail_cache), name="enrichment", daemon=True)
+    thread.start()
+    return thread
+
+# Run scrapes on a fixed interval until SIGINT/SIGTERM. With offline=True listing pages
+# are replayed from the HTTP cache only, for testing without network access.
+# The database is kept; maintenance archives articles past their retention.
+def run_service(db_path=DATABASE_PATH, interval=SCRAPE_INTERVAL, once=False, depth=CRAWL_DEPTH, metrics_file=None, cache_dir=HTTP_CACHE_DIR, offline=False, retention_days=RETENTION_DAYS, category_retention=None, sources_file=SOURCES_FILE, parse_processes=PARSE_PROCESSES, thumbnail_dir=THUMBNAIL_CACHE_DIR, thumbnail_cache_bytes=THUMBNAIL_CACHE_MAX_BYTES):
+    registry = load_registry(sources_file)
+    db = DatabaseManager(db_path)
+    session = create_http_session(registry)
+    http_cache = HttpCache(cache_dir, offline=offline) if cache_dir else None
+    thumbnail_cache = ThumbnailCache(thumbnail_dir, thumbnail_cache_bytes) if thumbnail_dir else None
+    stop = threading.Event()
+    
+    def request_stop(signum, frame):
+        logger.info("Stopping scraper service")
+        stop.set()
+    
+    signal.signal(signal.SIGINT, request_stop)
+    signal.signal(signal.SIGTERM, request_stop)
+    
+    try:
+        while not stop.is_set():
+            try:
+                changed = run_scrape(db, session, depth=depth, http_cache=http_cache, registry=registry, parse_processes=parse_processes)
+                logger.info("Scrape finished, %d articles new or changed", changed)
+            except Exception:
+                logger.exception("Scrape failed")
+            # Replayed listings only: no network for article pages or images
+            if not offline:
+                run_enrichment(db, session, registry, thumbnail_cache)
+            try:
+                archived = maintain_database(db, retention_days, category_retention)
+                if archived is not None:
+                    logger.info("Maintenance finished, %d articles archived", archived)
+            except Exception:
+                logger.exception("Maintenance failed")
+            if http_cache is not None and not offline:
+                http_cache.prune()
+            if metrics_file:
+                export_metrics(metrics_file)
+            if once:
+                break
+            stop.wait(interval)
+    finally:
+        db.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Background Digiato scraper writing to the shared news database")
+    parser.add_argument("--db", default=DATABASE_PATH, help="SQLite database file shared with the Streamlit app")
+    parser.add_argument("--interval", type=int, default=SCRAPE_INTERVAL, help="seconds between scrapes")
+    parser.add_argument("--once", action="store_true", help="scrape a single time and exit")
+    parser.add_argument("--depth", type=int, default=CRAWL_DEPTH, help="listing pages to follow per category (stops early at known articles)")
+    parser.add_argument("--metrics-file", help="write stage metrics here after every run (JSON lines for *.jsonl, Prometheus text otherwise)")
+    parser.add_argument("--cache-dir", default=HTTP_CACHE_DIR, help="on-disk HTTP cache for listing pages (empty string disables it)")
+    parser.add_argument("--offline", action="store_true", help="replay listing pages from the HTTP cache without network access")
+    parser.add_argument("--sources", default=SOURCES_FILE, help="source registry (JSON) with listing URLs, selectors and per-host budgets")
+    parser.add_argument("--retention-days", type=int, default=RETENTION_DAYS, help="days an article stays in the news table before it is archived")
+    parser.add_argument("--parse-processes", type=int, default=PARSE_PROCESSES, help="worker processes parsing listing pages on deep crawls (1 parses in the fetch threads)")
+    parser.add_argument("--thumbnail-dir", default=THUMBNAIL_CACHE_DIR, help="cache of article thumbnails shown by the UI (empty string disables thumbnails)")
+    parser.add_argument("--thumbnail-cache-mb", type=int, default=THUMBNAIL_CACHE_MAX_BYTES // (1024 * 1024), help="size of the thumbnail cache before the least recently used are evicted")
+    parser.add_argument("--keep", action="append", default=[], metavar="CATEGORY=DAYS", help="retention for one category, overriding --retention-days (repeatable)")
+    args = parser.parse_args(argv)
+    
+    category_retention = dict(CATEGORY_RETENTION_DAYS)
+    for item in args.keep:
+        name, _, days = item.rpartition("=")
+        if not name or not days.isdigit():
+            parser.error(f"--keep expects CATEGORY=DAYS, got {item!r}")
+        category_retention[name] = int(days)
+    
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    run_service(args.db, args.interval, args.once, args.depth, args.metrics_file, args.cache_dir, args.offline, args.retention_days, category_retention, args.sources, args.parse_processes, args.thumbnail_dir, args.thumbnail_cache_mb * 1024 * 1024)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+import bisect
+import heapq
+import re
+import threading
+import unicodedata
+
+from database import normalize_persian
+
+# Shortest word prefix that gets completions, and how many are offered
+SUGGEST_MIN_PREFIX = 2
+SUGGEST_LIMIT = 5
+
+# Title matches rank twice as high as body matches, like the bm25 weights of the search
+TITLE_WEIGHT = 2
+
+# Edited or removed articles are applied to the index one by one up to this many per
+# refresh; past that a new index is built off the lock and swapped in
+INCREMENTAL_MAX_CHANGES = 1000
+
+# Word characters without the underscore, which the full-text tokenizer splits on
+INDEX_TOKEN = re.compile(r'[^\W_]+')
+
+# Words of a text, normalized like the full-text index
+def surface_tokens(text):
+    return INDEX_TOKEN.findall(normalize_persian(text))
+
+# A word with its remaining combining marks removed. Folding more than the full-text
+# index does is safe: the prefix index may only ever claim more matches than the
+# database, never fewer.
+def fold_token(token):
+    return "".join(c for c in unicodedata.normalize("NFKD", token) if not unicodedata.combining(c))
+
+def index_tokens(text):
+    return [fold_token(token) for token in surface_tokens(text)]
+
+# In-memory prefix index over the words of article titles and bodies (the excerpts
+# stored with each article, not the full text): a sorted array of distinct tokens
+# searched with bisect, plus the sorted ids of the articles holding each token. It
+# answers "which articles can this query match?" and ranked word completions without
+# a database round trip. refresh() follows the data generation: new articles are added,
+# and edited or removed ones are taken out using their old text from the
+# news_text_changes log and added again as they are now.
+class PrefixIndex:
+    def __init__(self):
+        self.tokens = []
+        self.postings = {}
+        self.title_counts = {}
+        # Folded token -> word as written, so completions are searched as written
+        self.surface = {}
+        self.generation = None
+        self.max_id = 0
+        self.article_count = 0
+        # Last entry of news_text_changes already reflected in the index
+        self.change_seq = 0
+        # Guards the index structures; held by queries and only briefly by refresh
+        self._lock = threading.Lock()
+        # One refresh at a time, reading the database without blocking queries
+        self._refresh_lock = threading.Lock()
+    
+    def _add(self, news_id, title, body, new_tokens):
+        words = {fold_token(word): word for word in surface_tokens(body)}
+        title_words = {fold_token(word): word for word in surface_tokens(title)}
+        words.update(title_words)
+        for token, word in words.items():
+            ids = self.postings.get(token)
+            if ids is None:
+                self.postings[token] = ids = []
+                self.surface[token] = word
+                new_tokens.append(token)
+            # New rows arrive in id order; re-added edits go to their place
+            if ids and ids[-1] > news_id:
+                bisect.insort(ids, news_id)
+            else:
+                ids.append(news_id)
+            if token in title_words:
+                self.title_counts[token] = self.title_counts.get(token, 0) + 1
+    
+    # Take out the postings added for an article with this title and body
+    def _remove(self, news_id, title, body, emptied):
+        title_words = {fold_token(word) for word in surface_tokens(title)}
+        for token in title_words.union(fold_token(word) for word in surface_tokens(body)):
+            ids = self.postings.get(token)
+            index = bisect.bisect_left(ids, news_id) if ids else 0
+            if not ids or index == len(ids) or ids[index] != news_id:
+                continue
+            del ids[index]
+            if token in title_words:
+                self.title_counts[token] -= 1
+            if not ids:
+                del self.postings[token]
+                del self.surface[token]
+                self.title_counts.pop(token, None)
+                emptied.add(token)
+    
+    def _load(self, rows):
+        new_tokens = []
+        for news_id, title, body in rows:
+            self._add(news_id, title, body, new_tokens)
+            self.max_id = max(self.max_id, news_id)
+            self.article_count += 1
+        # One merge of the sorted array instead of an insertion per new token
+        if new_tokens:
+            self.tokens = sorted(self.tokens + new_tokens)
+    
+    # Bring the index up to the given data generation
+    def refresh(self, db, generation):
+        with self._refresh_lock:
+            if generation == self.generation:
+                return
+            with db.reader() as conn:
+                # The change log and the rows are read from one snapshot
+                conn.execute("BEGIN")
+                try:
+                    first_seq, last_seq = conn.execute("""
+                        SELECT MIN(seq), (SELECT seq FROM sqlite_sequence WHERE name = 'news_text_changes')
+                        FROM news_text_changes
+                    """).fetchone()
+                    last_seq = last_seq or 0
+                    # Old text of each article at its first change since the last
+                    # refresh, i.e. the text the index holds. Articles added after it
+                    # were never indexed.
+                    changes = conn.execute("""
+                        SELECT news_id, title, body FROM news_text_changes
+                        WHERE seq IN (SELECT MIN(seq) FROM news_text_changes WHERE seq > ? GROUP BY news_id)
+                          AND news_id <= ?
+                    """, (self.change_seq, self.max_id)).fetchall()
+                    # Changes pruned from the log before this index saw them
+                    missed = (first_seq if first_seq is not None else last_seq + 1) > self.change_seq + 1
+                    
+                    if self.generation is None or missed or len(changes) > INCREMENTAL_MAX_CHANGES:
+                        fresh = PrefixIndex()
+                        fresh._load(conn.execute("SELECT id, title, body FROM news ORDER BY id"))
+                        with self._lock:
+                            self.tokens = fresh.tokens
+                            self.postings = fresh.postings
+                            self.title_counts = fresh.title_counts
+                            self.surface = fresh.surface
+                            self.max_id = fresh.max_id
+                            self.article_count = fresh.article_count
+                            self.change_seq = last_seq
+                            self.generation = generation
+                        return
+                    
+                    changed_ids = [news_id for news_id, title, body in changes]
+                    current = []
+                    # Stay well below SQLite's bound-parameter limit
+                    for start in range(0, len(changed_ids), 500):
+                        chunk = changed_ids[start:start + 500]
+                        current.extend(conn.execute(
+                            f"SELECT id, title, body FROM news WHERE id IN ({', '.join('?' * len(chunk))})", chunk
+                        ))
+                    new_rows = conn.execute("SELECT id, title, body FROM news WHERE id > ? ORDER BY id", (self.max_id,)).fetchall()
+                finally:
+                    conn.execute("COMMIT")
+            
+            with self._lock:
+                emptied = set()
+                for news_id, title, body in changes:
+                    self._remove(news_id, title, body, emptied)
+                self.article_count -= len(changes)
+                if emptied:
+                    self.tokens = [token for token in self.tokens if token not in emptied]
+                self._load(current + new_rows)
+                self.change_seq = last_seq
+                self.generation = generation
+    
+    # Index range of the tokens starting with prefix
+    def _range(self, prefix):
+        start = bisect.bisect_left(self.tokens, prefix)
+        end = bisect.bisect_left(self.tokens, prefix + "\U0010ffff", start)
+        return start, end
+    
+    # Ids of the articles that may match the query: those holding a token with each
+    # query word as prefix. Words too common to intersect cheaply (more than `limit`
+    # ids) only have to occur somewhere. An empty set means the full-text search cannot
+    # return anything, also when every word occurs but never in the same article; None
+    # means every word is too common to narrow anything down.
+    def candidates(self, text, limit=10_000):
+        with self._lock:
+            result = None
+            for token in index_tokens(text):
+                start, end = self._range(token)
+                if start == end:
+                    return set()
+                ids = set()
+                for index in range(start, end):
+                    ids.update(self.postings[self.tokens[index]])
+                    if len(ids) > limit:
+                        ids = None
+                        break
+                if ids is not None:
+                    result = ids if result is None else result & ids
+                    if not result:
+                        return set()
+            return result
+    
+    # Completions of the last word of text, ranked by how many articles hold them
+    # (title matches weighted), as full query strings
+    def suggest(self, text, limit=SUGGEST_LIMIT):
+        words = text.split()
+        if not words or text[-1:].isspace():
+            return []
+        tokens = index_tokens(words[-1])
+        if len(tokens) != 1 or len(tokens[0]) < SUGGEST_MIN_PREFIX:
+            return []
+        
+        with self._lock:
+            start, end = self._range(tokens[0])
+            best = heapq.nlargest(
+                limit,
+                (index for index in range(start, end) if self.tokens[index] != tokens[0]),
+                key=lambda index: len(self.postings[self.tokens[index]]) + (TITLE_WEIGHT - 1) * self.title_counts.get(self.tokens[index], 0),
+            )
+            completions = [self.surface[self.tokens[index]] for index in best]
+        prefix = " ".join(words[:-1])
+        return [f"{prefix} {completion}".strip() for completion in completions]
+    
+    def stats(self):
+        with self._lock:
+            return {
+                "tokens": len(self.tokens),
+                "articles": self.article_count,
+                "generation": self.generation,
+            }
@@ -0,0 +1,219 @@
+import json
+import os
+import re
+import threading
+import time
+from urllib.parse import urlparse
+
+import soupsieve
+from bs4 import SoupStrainer
+
+# Registry file; DIGIATO_SOURCES points at another one
+SOURCES_FILE = os.environ.get("DIGIATO_SOURCES", os.path.join(os.path.dirname(os.path.abspath(__file__)), "sources.json"))
+
+# Selector cascades used when a source does not define its own, most specific first.
+# The last selector of each cascade is the catch-all.
+DEFAULT_SELECTORS = {
+    "article": ["article", ".post", ".rowCard", ".post-item"],
+    "title": ["h2 a", "h3 a", ".post-title a", "a[class*='title']", ".entry-title a"],
+    "body": [
+        "p[class*='description']",
+        "p[class*='excerpt']",
+        ".post-excerpt",
+        ".entry-content p",
+        "p",
+    ],
+    # Main text container of an article page
+    "content": [".entry-content", ".post-content", ".article-content", "article .content", "article"],
+    # Lead image of a listed article; lazy-loaded images keep the real URL in data-src
+    "image": ["img[data-src]", "img[data-lazy-src]", "img[src]", "img"],
+}
+
+# Per-host budget for hosts without their own entry: sustained requests per second,
+# burst size and simultaneous requests
+DEFAULT_HOST_BUDGET = {"rate": 2.0, "burst": 4, "concurrency": 4}
+
+# Total crawl threads when the registry does not say otherwise
+DEFAULT_MAX_WORKERS = 4
+
+# Used when there is no registry file
+DEFAULT_SOURCES = [
+    {"url": "https://digiato.com/topic/tech", "name": "تکنولوژی"},
+    {"url": "https://digiato.com/topic/car", "name": "خودرو"},
+    {"url": "https://digiato.com/topic/science", "name": "علمی"},
+    {"url": "https://digiato.com/topic/business", "name": "کسب و کار"},
+]
+
+# "tag", ".class" or "tag.class.other" - selectors a SoupStrainer can pre-filter on
+SIMPLE_SELECTOR = re.compile(r'^([a-z][a-z0-9]*)?((?:\.[\w-]+)*)$')
+
+# Token bucket: `rate` tokens per second, at most `burst` saved up. A caller that finds
+# the bucket empty reserves the next token and sleeps until it is due, so waiting
+# callers are served in order and the long-run rate never exceeds `rate`.
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait:
+            time.sleep(wait)
+        return wait
+
+# Request budget of one host: a concurrency cap plus a token-bucket rate limit.
+# Use as a context manager around every request to the host.
+class HostBudget:
+    def __init__(self, rate, burst, concurrency):
+        self.bucket = TokenBucket(rate, burst)
+        self.concurrency = concurrency
+        self._slots = threading.BoundedSemaphore(concurrency)
+    
+    def acquire(self):
+        # Take a slot first, so a token is never spent while waiting for one
+        self._slots.acquire()
+        self.bucket.acquire()
+    
+    def release(self):
+        self._slots.release()
+    
+    def __enter__(self):
+        self.acquire()
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.release()
+
+# Budgets and selectors are keyed by host name without "www."
+def host_of(url):
+    host = (urlparse(url).hostname or "").lower()
+    return host[4:] if host.startswith("www.") else host
+
+def compile_cascade(selectors, kind):
+    if not selectors or not all(isinstance(selector, str) for selector in selectors):
+        raise ValueError(f"{kind} selectors must be a non-empty list of strings")
+    return [soupsieve.compile(selector) for selector in selectors]
+
+# SoupStrainer keeping only the elements the article selectors can match, or None when
+# a selector is too complex to pre-filter on (the whole page is parsed then)
+def article_strainer(selectors):
+    names = set()
+    classes = set()
+    for selector in selectors:
+        match = SIMPLE_SELECTOR.match(selector.strip())
+        if not match:
+            return None
+        if match.group(2):
+            classes.update(match.group(2).strip(".").split("."))
+        else:
+            names.add(match.group(1))
+    
+    # Attribute values are still raw strings at this point of parsing
+    def is_article_container(name, attrs):
+        if name in names:
+            return True
+        value = attrs.get("class") or ""
+        if isinstance(value, str):
+            value = value.split()
+        return not classes.isdisjoint(value)
+    
+    return SoupStrainer(is_article_container)
+
+# Listing sources and host budgets. Each source is a dict with url, name (the category
+# articles are stored under), host, compiled cascades and strainer, and the selector
+# strings they were compiled from; a registry entry with several urls yields one
+# source per url.
+class SourceRegistry:
+    def __init__(self, sources, hosts=None, default_budget=None, max_workers=DEFAULT_MAX_WORKERS, default_selectors=None):
+        self.max_workers = max_workers
+        self.default_budget = dict(DEFAULT_HOST_BUDGET, **(default_budget or {}))
+        self.host_settings = {host_of(f"//{host}"): dict(self.default_budget, **settings) for host, settings in (hosts or {}).items()}
+        for host, settings in [("default", self.default_budget), *self.host_settings.items()]:
+            if float(settings["rate"]) <= 0 or float(settings["burst"]) < 1 or int(settings["concurrency"]) < 1:
+                raise ValueError(f"host budget for {host} needs rate > 0, burst >= 1 and concurrency >= 1")
+        self._budgets = {}
+        self._lock = threading.Lock()
+        
+        selectors = dict(DEFAULT_SELECTORS, **(default_selectors or {}))
+        self.default_cascades = {kind: compile_cascade(selectors[kind], kind) for kind in DEFAULT_SELECTORS}
+        self.default_strainer = article_strainer(selectors["article"])
+        self.content_cascades = {}
+        
+        self.sources = []
+        for entry in sources:
+            name = entry.get("name")
+            urls = entry.get("urls") or ([entry["url"]] if entry.get("url") else [])
+            if not name or not urls:
+                raise ValueError(f"source entry needs a name and url/urls: {entry!r}")
+            
+            cascades = dict(self.default_cascades)
+            strainer = self.default_strainer
+            source_selectors = dict(selectors)
+            for kind, custom in (entry.get("selectors") or {}).items():
+                if kind not in DEFAULT_SELECTORS:
+                    raise ValueError(f"unknown selector kind {kind!r} in source {name!r}")
+                cascades[kind] = compile_cascade(custom, kind)
+                source_selectors[kind] = list(custom)
+                if kind == "article":
+                    strainer = article_strainer(custom)
+            
+            for url in urls:
+                host = host_of(url)
+                # Article pages are matched to a source by host for the full-text stage
+                self.content_cascades.setdefault(host, cascades["content"])
+                self.sources.append({
+                    "url": url,
+                    "name": name,
+                    "host": host,
+                    "cascades": cascades,
+                    "strainer": strainer,
+                    # Selector strings, for processes that compile their own cascades
+                    "selectors": source_selectors,
+                })
+    
+    # Budget shared by every request to the host of url
+    def budget(self, url):
+        host = host_of(url)
+        with self._lock:
+            if host not in self._budgets:
+                settings = self.host_settings.get(host, self.default_budget)
+                self._budgets[host] = HostBudget(float(settings["rate"]), float(settings["burst"]), int(settings["concurrency"]))
+            return self._budgets[host]
+    
+    def content_cascade(self, url):
+        return self.content_cascades.get(host_of(url), self.default_cascades["content"])
+    
+    # Connections worth keeping open per host pool
+    def max_concurrency(self):
+        settings = [self.default_budget, *self.host_settings.values()]
+        return max(int(setting["concurrency"]) for setting in settings)
+
+# Load the registry file; the built-in Digiato sources are used when it does not exist.
+#
+# {
+#   "max_workers": 8,
+#   "defaults": {"selectors": {...}, "host": {"rate": 2, "burst": 4, "concurrency": 4}},
+#   "hosts": {"digiato.com": {"rate": 1, "concurrency": 2}},
+#   "sources": [{"name": "تکنولوژی", "urls": ["https://digiato.com/topic/tech"], "selectors": {...}}]
+# }
+def load_registry(path=SOURCES_FILE):
+    if not os.path.exists(path):
+        return SourceRegistry(DEFAULT_SOURCES)
+    with open(path, encoding="utf-8") as f:
+        config = json.load(f)
+    defaults = config.get("defaults") or {}
+    return SourceRegistry(
+        config.get("sources") or [],
+        hosts=config.get("hosts"),
+        default_budget=defaults.get("host"),
+        max_workers=int(config.get("max_workers", DEFAULT_MAX_WORKERS)),
+        default_selectors=defaults.get("selectors"),
+    )
@@ -0,0 +1,134 @@
+import base64
+import hashlib
+import io
+import os
+import threading
+
+from atomic_file import write_atomic
+
+# Resizing needs Pillow; without it only images already small enough are kept, as they are
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+# On-disk thumbnail cache settings: directory (shared by the scraper service and the UI),
+# total size kept before the least recently used thumbnails are evicted, and the
+# bounding box and JPEG quality of a thumbnail
+THUMBNAIL_CACHE_DIR = os.environ.get("DIGIATO_THUMBNAIL_CACHE", ".thumbnail_cache")
+THUMBNAIL_CACHE_MAX_BYTES = 64 * 1024 * 1024
+THUMBNAIL_SIZE = (320, 180)
+THUMBNAIL_QUALITY = 70
+
+# Downloads larger than this are abandoned; without Pillow, larger images are not kept
+IMAGE_MAX_BYTES = 5 * 1024 * 1024
+UNRESIZED_MAX_BYTES = 48 * 1024
+
+# File extension -> MIME type of the stored thumbnails, and the magic bytes that
+# identify images stored without Pillow
+THUMBNAIL_TYPES = {"jpg": "image/jpeg", "png": "image/png", "gif": "image/gif", "webp": "image/webp"}
+IMAGE_SIGNATURES = ((b"\xff\xd8\xff", "jpg"), (b"\x89PNG\r\n\x1a\n", "png"), (b"GIF8", "gif"))
+
+# Extension of an image by its magic bytes, or None when it is not a known image type
+def image_type(data):
+    for signature, extension in IMAGE_SIGNATURES:
+        if data.startswith(signature):
+            return extension
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "webp"
+    return None
+
+# Shrink an image to fit THUMBNAIL_SIZE as a JPEG. Returns (bytes, extension), or None
+# when the data is not a usable image.
+def make_thumbnail(data):
+    if Image is None:
+        extension = image_type(data)
+        if extension is None or len(data) > UNRESIZED_MAX_BYTES:
+            return None
+        return data, extension
+    
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            # Lets the JPEG decoder downscale while decoding, far cheaper than a full decode
+            image.draft("RGB", THUMBNAIL_SIZE)
+            thumbnail = image.convert("RGB")
+        thumbnail.thumbnail(THUMBNAIL_SIZE)
+        output = io.BytesIO()
+        thumbnail.save(output, "JPEG", quality=THUMBNAIL_QUALITY, optimize=True, progressive=True)
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return None
+    return output.getvalue(), "jpg"
+
+# Content-addressed thumbnail store: every thumbnail is one file named by the SHA-256 of
+# its bytes, so an image listed under several articles or URLs is stored once. The
+# key ("<sha256>.<ext>") is what the database records per article. touch() marks a
+# thumbnail as shown by refreshing its modification time, and evict() removes the least
+# recently used files once the directory grows past max_bytes.
+class ThumbnailCache:
+    def __init__(self, directory=THUMBNAIL_CACHE_DIR, max_bytes=THUMBNAIL_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+    
+    def _path(self, key):
+        return os.path.join(self.directory, os.path.basename(key))
+    
+    # Store a thumbnail made by make_thumbnail and return its key
+    def put(self, data, extension):
+        key = f"{hashlib.sha256(data).hexdigest()}.{extension}"
+        path = self._path(key)
+        if os.path.exists(path):
+            os.utime(path)
+            return key
+        write_atomic(path, data)
+        return key
+    
+    # Whether a thumbnail is still in the cache, without marking it as used
+    def contains(self, key):
+        return os.path.exists(self._path(key))
+    
+    # Mark a thumbnail as used; False when it is not in the cache (evicted)
+    def touch(self, key):
+        try:
+            os.utime(self._path(key))
+        except OSError:
+            return False
+        return True
+    
+    # The thumbnail as a data: URI for inline display, or None when it was evicted
+    def data_uri(self, key):
+        try:
+            with open(self._path(key), "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        mime_type = THUMBNAIL_TYPES.get(key.rsplit(".", 1)[-1], "application/octet-stream")
+        return f"data:{mime_type};base64,{base64.b64encode(data).decode('ascii')}"
+    
+    # Remove least recently used thumbnails until the cache is back under 90% of
+    # max_bytes, so eviction does not run again after every new file. Returns the
+    # number of files removed.
+    def evict(self):
+        with self._lock:
+            files = []
+            total = 0
+            for entry in os.scandir(self.directory):
+                if entry.is_file() and not entry.name.endswith(".tmp"):
+                    stat = entry.stat()
+                    files.append((stat.st_mtime, stat.st_size, entry.path))
+                    total += stat.st_size
+            if total <= self.max_bytes:
+                return 0
+            
+            removed = 0
+            for mtime, size, path in sorted(files):
+                if total <= self.max_bytes * 0.9:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
+                removed += 1
+            return removed